@@ -26,15 +26,26 @@ Website: https://github.com/samyboy/check_iftraffic_nrpe.py
 """
 
 import array
+import copy
 import fcntl
+import hashlib
+import json
 import os
 import re
+import shutil
+import signal
 import socket
 import struct
 import sys
+import tempfile
 import time
 import argparse
 
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
 __version__ = '0.12.1'
 __author__ = 'Samuel Krieg'
 
@@ -88,6 +99,8 @@ class InterfaceDetection(object):
 
     def query_linktype(self, interface):
         """Detects automatically the type of the *interface*"""
+        if not isinstance(interface, bytes):
+            interface = interface.encode()
         buff = struct.pack("%ds1024x" % self.IF_NAMESIZE, interface)
         buff = array.array("b", buff)
         fcntl.ioctl(self.socket.fileno(), self.SIOCGIFHWADDR, buff, True)
@@ -106,12 +119,16 @@ class DataFile(object):
     """data file format:
         - line 1: uptime
         - rest: data
+        - optional: one "#name json" line per section (see
+          DataFile.sections)
     """
 
     def __init__(self, filename):
         self.filename = filename
         self.uptime = None
         self.data = None
+        # state kept between two runs, must be JSON serializable
+        self.sections = {}
 
     def mtime(self):
         """Returns the last modification time of the datafile.
@@ -125,7 +142,14 @@ class DataFile(object):
         content = file_obj.readlines()
         file_obj.close()
         self.uptime = float(content[0])
-        self.data = "".join(content[1:])
+        self.data = "".join(line for line in content[1:]
+                            if not line.startswith('#'))
+        sections = {}
+        for line in content[1:]:
+            if line.startswith('#'):
+                name, section = line[1:].split(' ', 1)
+                sections[name] = json.loads(section)
+        self.sections = sections
         return self.uptime, self.data
 
     def write(self):
@@ -136,6 +160,426 @@ class DataFile(object):
         file_obj = open(self.filename, 'w')
         file_obj.write("%s\n" % self.uptime)
         file_obj.write(self.data)
+        if self.data and not self.data.endswith("\n"):
+            file_obj.write("\n")
+        for name in sorted(self.sections):
+            file_obj.write("#%s %s\n" % (name, json.dumps(
+                self.sections[name], separators=(',', ':'),
+                sort_keys=True)))
+        file_obj.close()
+
+    def touch(self, timestamp):
+        """Sets the modification time of the datafile to *timestamp*.
+           The modification time is the time of the stored measure.
+        """
+        os.utime(self.filename, (timestamp, timestamp))
+
+
+class TraceFile(object):
+    """trace file format:
+        - one JSON snapshot per line with the keys "time" (epoch),
+          "uptime" and "net_dev" (raw content of /proc/net/dev)
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def append(self, timestamp, uptime, net_dev):
+        """Appends a snapshot at the end of the trace file"""
+        file_obj = open(self.filename, 'a')
+        file_obj.write(json.dumps({'time': timestamp,
+                                   'uptime': uptime,
+                                   'net_dev': net_dev}) + "\n")
+        file_obj.close()
+
+    def read(self):
+        """Returns the list of the (time, uptime, net_dev) snapshots"""
+        snapshots = []
+        file_obj = open(self.filename, 'r')
+        for line in file_obj:
+            if not line.strip():
+                continue
+            snapshot = json.loads(line)
+            snapshots.append((snapshot['time'],
+                              snapshot['uptime'],
+                              snapshot['net_dev']))
+        file_obj.close()
+        return snapshots
+
+
+class ResultCache(object):
+    """cache file format:
+        - line 1: time of the result
+        - line 2: status
+        - rest: output
+       The cache file is locked while the result is computed so concurrent
+       invocations wait for it instead of sampling again.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file_obj = None
+
+    def lock(self):
+        """Opens and locks the cache file, waits for the other invocations"""
+        self.file_obj = open(self.filename, 'a+')
+        fcntl.flock(self.file_obj.fileno(), fcntl.LOCK_EX)
+
+    def unlock(self):
+        """Unlocks and closes the cache file"""
+        self.file_obj.close()
+        self.file_obj = None
+
+    def read(self, ttl, now):
+        """Returns the status and the output of the cached result if it is
+           younger than *ttl* seconds at the epoch *now*, else None.
+        """
+        self.file_obj.seek(0)
+        content = self.file_obj.read().split("\n", 2)
+        try:
+            timestamp = float(content[0])
+            status, output = content[1], content[2]
+        except (IndexError, ValueError):
+            return None
+        if not 0 <= now - timestamp < ttl:
+            return None
+        return status, output
+
+    def write(self, now, status, output):
+        """Replaces the cached result"""
+        self.file_obj.seek(0)
+        self.file_obj.truncate()
+        self.file_obj.write("%s\n%s\n%s" % (now, status, output))
+        self.file_obj.flush()
+
+
+class ArchiveFile(object):
+    """Compressed append-only archive of the counters of the interfaces.
+
+       archive file format: a sequence of frames, one per run
+        - varint: length of the rest of the frame
+        - byte: KEYFRAME or DELTAFRAME
+        - keyframe: time (ms), the counter names, the series (interface)
+          names, then the value of every counter of every series
+        - delta frame: the delta-of-delta of the time then the
+          delta-of-delta of every counter of every series
+       The integers are zigzag encoded varints: a run at a regular
+       interval on an interface with a steady rate costs one byte per
+       counter. A keyframe is written every *keyframe_interval* frames
+       or when the interfaces change, so a range read only decodes
+       from the last keyframe before the range.
+       The encoder state (see append()) is kept by the caller. A partial
+       frame at the end of the file is truncated, and a keyframe is
+       written when another writer appended since the state was saved.
+    """
+    KEYFRAME = 0
+    DELTAFRAME = 1
+    keyframe_interval = 60
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    @staticmethod
+    def encode_varint(value, buff):
+        """Appends the zigzag varint of the integer *value* to *buff*"""
+        value = value * 2 if value >= 0 else -value * 2 - 1
+        while value > 0x7F:
+            buff.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buff.append(value)
+
+    @staticmethod
+    def decode_varint(buff, offset):
+        """Returns the integer at *offset* of *buff* and the next offset"""
+        value = 0
+        shift = 0
+        while True:
+            byte = buff[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        return (value >> 1) if not value & 1 else -(value >> 1) - 1, offset
+
+    def encode_string(self, value, buff):
+        """Appends the length and the UTF-8 bytes of *value* to *buff*"""
+        value = value.encode('utf-8')
+        self.encode_varint(len(value), buff)
+        buff.extend(value)
+
+    def append(self, timestamp, counters, data, state=None):
+        """Appends the *counters* of the interfaces of *data* measured at
+           the epoch *timestamp*. *state* is the value returned by the
+           previous append(). Returns the new state (JSON serializable).
+        """
+        series = sorted(data)
+        values = [data[if_name][counter]
+                  for if_name in series for counter in counters]
+        time_ms = int(round(timestamp * 1000))
+        size = os.path.getsize(self.filename) \
+            if os.path.exists(self.filename) else 0
+        if state and size > state['size']:
+            # remove the partial frame of a crash during an append, the
+            # complete frames of another writer are kept
+            end = self.end_of_frames(state['size'])
+            if end < size:
+                file_obj = open(self.filename, 'r+b')
+                file_obj.truncate(end)
+                file_obj.close()
+                size = end
+
+        frame = bytearray()
+        if (state and state['size'] == size and state['series'] == series and
+                state['counters'] == counters and
+                state['frames'] < self.keyframe_interval and
+                time_ms > state['time']):
+            frame.append(self.DELTAFRAME)
+            delta_time = time_ms - state['time']
+            self.encode_varint(delta_time - state['delta_time'], frame)
+            deltas = [value - previous
+                      for value, previous in zip(values, state['values'])]
+            for delta, previous in zip(deltas, state['deltas']):
+                self.encode_varint(delta - previous, frame)
+            frames = state['frames'] + 1
+        else:
+            frame.append(self.KEYFRAME)
+            self.encode_varint(time_ms, frame)
+            delta_time = 0
+            self.encode_varint(len(counters), frame)
+            for counter in counters:
+                self.encode_string(counter, frame)
+            self.encode_varint(len(series), frame)
+            for if_name in series:
+                self.encode_string(if_name, frame)
+            for value in values:
+                self.encode_varint(value, frame)
+            deltas = [0] * len(values)
+            frames = 0
+
+        buff = bytearray()
+        self.encode_varint(len(frame), buff)
+        buff.extend(frame)
+        file_obj = open(self.filename, 'ab')
+        file_obj.write(buff)
+        file_obj.close()
+
+        return {'size': size + len(buff), 'time': time_ms,
+                'delta_time': delta_time, 'counters': counters,
+                'series': series, 'values': values, 'deltas': deltas,
+                'frames': frames}
+
+    def read_length(self, file_obj):
+        """Returns the length of the frame at the position of *file_obj*
+           or None at the end of the file
+        """
+        buff = bytearray()
+        while not buff or buff[-1] & 0x80:
+            byte = file_obj.read(1)
+            if not byte:
+                return None
+            buff.extend(byte)
+        return self.decode_varint(buff, 0)[0]
+
+    def end_of_frames(self, offset=0):
+        """Returns the offset of the end of the last complete frame from
+           *offset*
+        """
+        size = os.path.getsize(self.filename)
+        file_obj = open(self.filename, 'rb')
+        try:
+            file_obj.seek(offset)
+            while True:
+                length = self.read_length(file_obj)
+                if length is None or file_obj.tell() + length > size:
+                    return offset
+                offset = file_obj.tell() + length
+                file_obj.seek(offset)
+        finally:
+            file_obj.close()
+
+    def keyframes(self):
+        """Yields the offset and the time (ms) of every keyframe, the other
+           frames are skipped without being read
+        """
+        file_obj = open(self.filename, 'rb')
+        try:
+            while True:
+                offset = file_obj.tell()
+                length = self.read_length(file_obj)
+                if length is None:
+                    break
+                start = file_obj.tell()
+                head = bytearray(file_obj.read(min(length, 11)))
+                if head and head[0] == self.KEYFRAME and len(head) > 1:
+                    yield offset, self.decode_varint(head, 1)[0]
+                file_obj.seek(start + length)
+        finally:
+            file_obj.close()
+
+    def frames(self, offset=0):
+        """Yields the kind and the content of the frames from *offset*,
+           one frame at a time
+        """
+        file_obj = open(self.filename, 'rb')
+        try:
+            file_obj.seek(offset)
+            while True:
+                length = self.read_length(file_obj)
+                if length is None:
+                    break
+                frame = bytearray(file_obj.read(length))
+                if len(frame) < length:
+                    # truncated by a crash during the append
+                    break
+                yield frame[0], frame[1:]
+        finally:
+            file_obj.close()
+
+    def read(self, since=None, until=None):
+        """Yields the (epoch, {interface: {counter: value}}) samples
+           between the epochs *since* and *until*. Only the frames from the
+           last keyframe before *since* are decoded.
+        """
+        since_ms = None if since is None else since * 1000
+        until_ms = None if until is None else until * 1000
+
+        # find the last keyframe before the range
+        first = 0
+        if since_ms is not None:
+            for offset, time_ms in self.keyframes():
+                if time_ms > since_ms:
+                    break
+                first = offset
+
+        counters = series = values = deltas = None
+        time_ms = delta_time = 0
+        for kind, frame in self.frames(first):
+            if kind == self.KEYFRAME:
+                time_ms, offset = self.decode_varint(frame, 0)
+                delta_time = 0
+                count, offset = self.decode_varint(frame, offset)
+                counters = []
+                for _ in range(count):
+                    length, offset = self.decode_varint(frame, offset)
+                    counters.append(
+                        frame[offset:offset + length].decode('utf-8'))
+                    offset += length
+                count, offset = self.decode_varint(frame, offset)
+                series = []
+                for _ in range(count):
+                    length, offset = self.decode_varint(frame, offset)
+                    series.append(
+                        frame[offset:offset + length].decode('utf-8'))
+                    offset += length
+                values = []
+                for _ in range(len(series) * len(counters)):
+                    value, offset = self.decode_varint(frame, offset)
+                    values.append(value)
+                deltas = [0] * len(values)
+            elif counters is None:
+                # no keyframe yet
+                continue
+            else:
+                delta_of_delta, offset = self.decode_varint(frame, 0)
+                delta_time += delta_of_delta
+                time_ms += delta_time
+                for index in range(len(values)):
+                    delta_of_delta, offset = self.decode_varint(frame, offset)
+                    deltas[index] += delta_of_delta
+                    values[index] += deltas[index]
+
+            if until_ms is not None and time_ms > until_ms:
+                break
+            if since_ms is not None and time_ms < since_ms:
+                continue
+            width = len(counters)
+            yield time_ms / 1000.0, dict(
+                (if_name, dict(zip(counters,
+                                   values[index * width:(index + 1) * width])))
+                for index, if_name in enumerate(series))
+
+
+class HistoryStore(object):
+    """SQLite history of the rates (in bytes per second).
+       The samples are indexed twice per interface: by time, to count a
+       time range, and by rate, so the maximum and the high percentiles
+       only walk the top of the index instead of sorting the whole time
+       range. A third index by time alone prunes the old samples of every
+       interface, including the ones that no longer exist.
+    """
+
+    schema = ["CREATE TABLE IF NOT EXISTS samples ("
+              "interface TEXT NOT NULL, "
+              "counter TEXT NOT NULL, "
+              "time REAL NOT NULL, "
+              "rate REAL NOT NULL)",
+              "CREATE INDEX IF NOT EXISTS samples_interface_time "
+              "ON samples (interface, counter, time, rate)",
+              "CREATE INDEX IF NOT EXISTS samples_interface_rate "
+              "ON samples (interface, counter, rate, time)",
+              "CREATE INDEX IF NOT EXISTS samples_time ON samples (time)"]
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        for statement in self.schema:
+            self.connection.execute(statement)
+
+    def close(self):
+        """Closes the database"""
+        self.connection.close()
+
+    def add(self, samples, prune_before=None):
+        """Stores the (interface, counter, time, rate) *samples* in a single
+           transaction and removes the samples older than *prune_before*.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO samples (interface, counter, time, rate) "
+                "VALUES (?, ?, ?, ?)", samples)
+            if prune_before is not None:
+                self.connection.execute(
+                    "DELETE FROM samples INDEXED BY samples_time "
+                    "WHERE time < ?", (prune_before,))
+
+    def count(self, interface, counter, since):
+        """Returns the number of samples since the epoch *since*"""
+        cursor = self.connection.execute(
+            "SELECT COUNT(*) FROM samples INDEXED BY samples_interface_time "
+            "WHERE interface = ? AND counter = ? AND time >= ?",
+            (interface, counter, since))
+        return cursor.fetchone()[0]
+
+    def maximum(self, interface, counter, since):
+        """Returns the highest rate since the epoch *since* or None"""
+        cursor = self.connection.execute(
+            "SELECT rate FROM samples INDEXED BY samples_interface_rate "
+            "WHERE interface = ? AND counter = ? AND time >= ? "
+            "ORDER BY rate DESC LIMIT 1", (interface, counter, since))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def percentile(self, interface, counter, since, percent):
+        """Returns the *percent* percentile (nearest rank) of the rates
+           since the epoch *since* or None
+        """
+        count = self.count(interface, counter, since)
+        if not count:
+            return None
+        rank = max(int(-(-percent * count // 100)), 1)
+        cursor = self.connection.execute(
+            "SELECT rate FROM samples INDEXED BY samples_interface_rate "
+            "WHERE interface = ? AND counter = ? AND time >= ? "
+            "ORDER BY rate DESC LIMIT 1 OFFSET ?",
+            (interface, counter, since, count - rank))
+        return cursor.fetchone()[0]
+
+    def query(self, interface, counter, since, report):
+        """Returns the value of the *report* (see parse_report())"""
+        if report['function'] == 'max':
+            return self.maximum(interface, counter, since)
+        return self.percentile(interface, counter, since, report['percent'])
 
 
 class ProcNetDev(object):
@@ -144,8 +588,8 @@ class ProcNetDev(object):
        Transform the /proc/net/dev file into a Python readable format
     """
 
-    def __init__(self):
-        self.filename = '/proc/net/dev'
+    def __init__(self, proc_root='/proc'):
+        self.filename = os.path.join(proc_root, 'net', 'dev')
         self.interfaces = {}
         self.content = None
 
@@ -193,14 +637,192 @@ class ProcNetDev(object):
         f.close()
         return self.content
 
+
+class ProcSoftnetStat(object):
+    """Transform the /proc/net/softnet_stat file into a Python readable
+       format. There is one line of hexadecimal 32 bits counters per CPU.
+    """
+    titles = ['processed', 'dropped', 'time_squeeze']
+    # the column containing the CPU number (since Linux 5.10)
+    cpu_column = 12
+    max_value = 2 ** 32 - 1
+
+    def __init__(self, proc_root='/proc'):
+        self.filename = os.path.join(proc_root, 'net', 'softnet_stat')
+        self.cpus = {}
+        self.content = None
+
+    def parse(self, data=None):
+        """Returns a python dictionnary including the counters of every CPU
+           of the `/proc/net/softnet_stat` file. *data* can be a string
+           containing the content of `/proc/net/softnet_stat`.
+        """
+        if data is None:
+            data = self.read()
+
+        fields = data.split()
+        if not fields:
+            return self.cpus
+        width = len(data.split("\n", 1)[0].split())
+
+        # take the columns by slicing then only convert the wanted ones
+        columns = [[int(field, 16) for field in fields[index::width]]
+                   for index in range(len(self.titles))]
+        if width > self.cpu_column:
+            cpus = [int(field, 16) for field in fields[self.cpu_column::width]]
+        else:
+            cpus = range(len(columns[0]))
+
+        for cpu, counters in zip(cpus, zip(*columns)):
+            self.cpus["cpu%d" % cpu] = dict(zip(self.titles, counters))
+        return self.cpus
+
+    def read(self, filename=None):
+        """Returns the content of the softnet_stat file as is."""
+        if filename is None:
+            filename = self.filename
+        f = open(filename, "r")
+        self.content = f.read()
+        f.close()
+        return self.content
+
+
+class NetlinkQdisc(object):
+    """Dumps the statistics of the root queueing discipline of every
+       interface with a single RTM_GETQDISC netlink request (see tc-s(8))
+    """
+    NETLINK_ROUTE = 0
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NLM_F_REQUEST = 0x1
+    NLM_F_DUMP = 0x300
+    RTM_NEWQDISC = 36
+    RTM_GETQDISC = 38
+    TCA_KIND = 1
+    TCA_STATS = 3
+    TCA_STATS2 = 7
+    TCA_STATS_QUEUE = 3
+    TC_H_ROOT = 0xFFFFFFFF
+    NLMSGHDR = "=IHHII"
+    TCMSG = "=BxxxiIII"
+    RTATTR = "=HH"
+    # struct gnet_stats_queue
+    STATS_QUEUE = "=IIIII"
+    # struct tc_stats, used by the kernels without TCA_STATS2
+    STATS = "=QIIIIIII"
+    titles = ['qlen', 'backlog', 'drops', 'requeues', 'overlimits']
+    # the kernel counters are 32 bits
+    max_value = 2 ** 32 - 1
+
+    def __init__(self):
+        self.qdiscs = {}
+        self.content = None
+
+    def read(self):
+        """Returns the raw netlink messages of the qdisc dump"""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             self.NETLINK_ROUTE)
+        try:
+            sock.bind((0, 0))
+            request = struct.pack(self.TCMSG, socket.AF_UNSPEC, 0, 0, 0, 0)
+            header = struct.pack(self.NLMSGHDR,
+                                 struct.calcsize(self.NLMSGHDR) + len(request),
+                                 self.RTM_GETQDISC,
+                                 self.NLM_F_REQUEST | self.NLM_F_DUMP, 1, 0)
+            sock.send(header + request)
+            chunks = []
+            done = False
+            while not done:
+                chunk = sock.recv(65536)
+                chunks.append(chunk)
+                for msg_type, payload in self.messages(chunk):
+                    if msg_type == self.NLMSG_ERROR:
+                        error = -struct.unpack("=i", payload[:4])[0]
+                        raise OSError(error, os.strerror(error))
+                    if msg_type == self.NLMSG_DONE:
+                        done = True
+        finally:
+            sock.close()
+        self.content = b"".join(chunks)
+        return self.content
+
+    def messages(self, data):
+        """Yields the (type, payload) of the netlink messages in *data*"""
+        header_size = struct.calcsize(self.NLMSGHDR)
+        offset = 0
+        while offset + header_size <= len(data):
+            length, msg_type, _, _, _ = struct.unpack_from(self.NLMSGHDR,
+                                                           data, offset)
+            if length < header_size:
+                break
+            yield msg_type, data[offset + header_size:offset + length]
+            offset += (length + 3) & ~3
+
+    def attributes(self, data):
+        """Yields the (type, payload) of the netlink attributes in *data*"""
+        header_size = struct.calcsize(self.RTATTR)
+        offset = 0
+        while offset + header_size <= len(data):
+            length, attr_type = struct.unpack_from(self.RTATTR, data, offset)
+            if length < header_size:
+                break
+            # remove the NLA_F_NESTED and NLA_F_NET_BYTEORDER flags
+            yield (attr_type & 0x3FFF,
+                   data[offset + header_size:offset + length])
+            offset += (length + 3) & ~3
+
+    def parse(self, data=None, names=None):
+        """Returns a python dictionnary including the statistics of the root
+           qdisc of every interface. *data* can contain the raw netlink
+           messages and *names* the interface names by index.
+        """
+        if data is None:
+            data = self.read()
+        if names is None:
+            names = interface_names()
+
+        tcmsg_size = struct.calcsize(self.TCMSG)
+        for msg_type, payload in self.messages(data):
+            if msg_type != self.RTM_NEWQDISC:
+                continue
+            _, ifindex, _, parent, _ = struct.unpack_from(self.TCMSG, payload)
+            if parent != self.TC_H_ROOT or ifindex not in names:
+                continue
+            stats = None
+            for attr_type, attr in self.attributes(payload[tcmsg_size:]):
+                if attr_type == self.TCA_STATS2:
+                    for stats_type, stats_attr in self.attributes(attr):
+                        if stats_type == self.TCA_STATS_QUEUE:
+                            stats = struct.unpack_from(self.STATS_QUEUE,
+                                                       stats_attr)
+                elif attr_type == self.TCA_STATS and stats is None:
+                    (_, _, drops, overlimits, _, _, qlen,
+                     backlog) = struct.unpack_from(self.STATS, attr)
+                    stats = (qlen, backlog, drops, 0, overlimits)
+            if stats is not None:
+                self.qdiscs[names[ifindex]] = dict(zip(self.titles, stats))
+        return self.qdiscs
+
 #
 # system functions
 #
 
 
-def uptime():
+def interface_names():
+    """Returns the names of the interfaces by index"""
+    if hasattr(socket, 'if_nameindex'):
+        return dict(socket.if_nameindex())
+    names = {}
+    for if_name in os.listdir('/sys/class/net'):
+        file_obj = open(os.path.join('/sys/class/net', if_name, 'ifindex'))
+        names[int(file_obj.read())] = if_name
+        file_obj.close()
+    return names
+
+
+def uptime(proc_root='/proc'):
     """Returns the uptime in seconds (float)"""
-    file_obj = open('/proc/uptime', 'r')
+    file_obj = open(os.path.join(proc_root, 'uptime'), 'r')
     uptime = float(file_obj.readline().split()[0])
     file_obj.close()
     return uptime
@@ -216,9 +838,10 @@ def max_counter():
     return sys.maxsize * 2 + 1
 
 
-def calc_diff(value1, uptime1, value2, uptime2):
+def calc_diff(value1, uptime1, value2, uptime2, max_value=None):
     """Calculate the difference between two values.
-    The function takes care of the maximum allowed value by the system"""
+    The function takes care of the maximum allowed value by the system
+    or of *max_value* if the counter is smaller (ex: 32 bits counters)"""
     # raise error if not numeric type
     for val in [value1, uptime1, value2, uptime2]:
         if not (isinstance(val, int) or
@@ -231,12 +854,106 @@ def calc_diff(value1, uptime1, value2, uptime2):
         return value2
     if value1 > value2:
         # the counter did a reset. I hope that max_counter() is doint right
-        return max_counter() - value1 + value2 + 1
+        if max_value is None:
+            max_value = max_counter()
+        return max_value - value1 + value2 + 1
     else:
         # normal behaviour
         return value2 - value1
 
 
+def welford_update(stats, value):
+    """Adds *value* to the running [count, mean, M2] *stats* (Welford's
+       algorithm) and returns the new stats. *stats* can be None.
+    """
+    count, mean, m2 = stats or (0, 0.0, 0.0)
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    # 7 significant digits keep the state file small
+    return [count, float('%.7g' % mean), float('%.7g' % m2)]
+
+
+def calc_zscore(stats, value, min_samples=2, min_deviation=0.0):
+    """Returns the number of standard deviations between *value* and the
+       mean of the [count, mean, M2] *stats*, or None if the stats do not
+       have *min_samples* samples yet.
+       The standard deviation is at least *min_deviation*.
+    """
+    if not stats or stats[0] < max(min_samples, 2):
+        return None
+    count, mean, m2 = stats
+    deviation = max((m2 / (count - 1)) ** 0.5, min_deviation)
+    if not deviation:
+        return 0.0 if value == mean else float('inf')
+    return (value - mean) / deviation
+
+
+def forecast_update(stats, day, value, half_life):
+    """Adds the rate *value* measured during the *day* (days since the
+       epoch) to the forecast *stats* and returns the new stats.
+       *stats* keeps the peak of the current day and the weighted sums
+       [w, w*x, w*y, w*x*x, w*x*y] of the (day, peak) points of the past
+       days for the least squares regression. The weights of the points
+       are halved every *half_life* days. *stats* can be None.
+    """
+    if stats is None:
+        return {'origin': day, 'day': day, 'peak': value, 'last': None,
+                'count': 0, 'sums': [0.0] * 5}
+    if day <= stats['day']:
+        stats['peak'] = max(stats['peak'], value)
+        return stats
+
+    # close the previous day
+    sums = stats['sums']
+    if stats['last'] is not None:
+        decay = 0.5 ** (float(stats['day'] - stats['last']) / half_life)
+        sums = [total * decay for total in sums]
+    x = stats['day'] - stats['origin']
+    y = stats['peak']
+    sums = [sums[0] + 1, sums[1] + x, sums[2] + y, sums[3] + x * x,
+            sums[4] + x * y]
+    # 7 significant digits keep the state file small
+    stats['sums'] = [float('%.7g' % total) for total in sums]
+    stats['last'] = stats['day']
+    stats['count'] += 1
+    stats['day'] = day
+    stats['peak'] = value
+    return stats
+
+
+def forecast_days(stats, day, capacity, min_days=2):
+    """Returns the number of days from *day* until the regression of the
+       daily peaks of the forecast *stats* reaches *capacity*, or None if
+       the peaks do not grow or there are less than *min_days* days.
+    """
+    if not stats or stats['count'] < max(min_days, 2):
+        return None
+    weight, sum_x, sum_y, sum_xx, sum_xy = stats['sums']
+    denominator = weight * sum_xx - sum_x * sum_x
+    if denominator <= 0:
+        return None
+    slope = (weight * sum_xy - sum_x * sum_y) / denominator
+    if slope <= 0:
+        return None
+    intercept = (sum_y - slope * sum_x) / weight
+    level = intercept + slope * (day - stats['origin'])
+    return max((capacity - level) / slope, 0.0)
+
+
+def baseline_bucket(timestamp, buckets):
+    """Returns the baseline bucket of the epoch *timestamp* (local time)
+       for the *buckets* granularity.
+    """
+    if buckets == 'none':
+        return '0'
+    localtime = time.localtime(timestamp)
+    if buckets == 'hour-of-day':
+        return str(localtime.tm_hour)
+    return str(localtime.tm_wday * 24 + localtime.tm_hour)
+
+
 class NagiosService(object):
     """Defines a Nagios service with a Perfdata output
     """
@@ -247,9 +964,17 @@ class NagiosService(object):
         self.max_level = None
         self.warn_level = None
         self.crit_level = None
+        # deviation from the baseline in standard deviations (anomaly mode)
+        self.zscore = None
+        self.warn_zscore = None
+        self.crit_zscore = None
+        # the lower values are the worst (ex: days left)
+        self.inverted = False
 
     def __str__(self):
         """Return the perfdata string"""
+        # "10:" is the Nagios range alerting below 10
+        level_format = '%s:' if self.inverted else '%s'
         return '%(label)s=%(value).2f;' \
                '%(warn_level)s;' \
                '%(crit_level)s;' \
@@ -257,17 +982,27 @@ class NagiosService(object):
                '%(max_level)s' % \
                {'label': self.label,
                 'value': self.value,
-                'warn_level': self.warn_level,
-                'crit_level': self.crit_level,
+                'warn_level': level_format % self.warn_level,
+                'crit_level': level_format % self.crit_level,
                 'min_level': self.min_level,
                 'max_level': self.max_level}
 
     def status(self):
         """Returns the string defining the Nagios status of the value"""
+        if self.inverted:
+            if self.value <= self.crit_level:
+                return 'CRITICAL'
+            if self.value <= self.warn_level:
+                return 'WARNING'
+            return 'OK'
         if self.value >= self.crit_level:
             return 'CRITICAL'
+        if self.zscore is not None and abs(self.zscore) >= self.crit_zscore:
+            return 'CRITICAL'
         if self.value >= self.warn_level:
             return 'WARNING'
+        if self.zscore is not None and abs(self.zscore) >= self.warn_zscore:
+            return 'WARNING'
         return 'OK'
 
 
@@ -325,10 +1060,13 @@ class NagiosResult(object):
         """
         sys.exit(self.status_codes[self.status])
 
-    def add(self, new_service):
-        """ Add a NagiosService object in the Nagios results
+    def add(self, new_service, thresholds=True):
+        """ Add a NagiosService object in the Nagios results.
+            If *thresholds* is False, the service is only added to the
+            perfdata and does not change the status.
         """
-        self.status = self.worst(self.status, new_service.status())
+        if thresholds:
+            self.status = self.worst(self.status, new_service.status())
         self._services.append(new_service)
 
 
@@ -367,6 +1105,43 @@ def specify_device(devices, data):
             del data[i]
 
 
+def parse_duration(duration):
+    """Converts a duration such as "90", "15m", "24h" or "7d" in seconds"""
+    multipliers = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+    match = re.match(r'^(\d+)([smhdw]?)$', duration)
+    if not match:
+        raise argparse.ArgumentTypeError("invalid duration: %s" % duration)
+    return int(match.group(1)) * multipliers[match.group(2) or 's']
+
+
+def parse_report(report):
+    """Parses a report definition such as "p95:24h" or "max:7d" """
+    match = re.match(r'^(max|p(\d+(?:\.\d+)?)):(.+)$', report)
+    if not match or (match.group(2) and float(match.group(2)) > 100):
+        raise argparse.ArgumentTypeError("invalid report: %s" % report)
+    return {'name': report.replace(':', '_'),
+            'function': 'max' if match.group(1) == 'max' else 'percentile',
+            'percent': float(match.group(2)) if match.group(2) else None,
+            'period': parse_duration(match.group(3))}
+
+
+def filter_devices(args, data, ifdetect):
+    """Removes from *data* the devices filtered out by the user arguments"""
+    # remove interfaces if needed
+    if args.exclude:
+        exclude_device(args.exclude, data)
+
+    if args.excludere:
+        excludere_device(args.excludere, data)
+
+    if args.linktype:
+        ifdetect.linktype_filter(args.linktype, data)
+
+    # only keep the wanted interfaces if specified
+    if args.interfaces:
+        specify_device(args.interfaces, data)
+
+
 def convert_bytes(value, unit):
     """Convert bytes to something else"""
     # default is byte:
@@ -390,7 +1165,7 @@ def convert_bytes(value, unit):
     raise Exception("Cannot parse %s" % unit)
 
 
-def parse_arguments(default_values):
+def parse_arguments(default_values, argv=None):
     """Try to parse the command line arguments given by the user"""
     global __author__
     global __version__
@@ -402,7 +1177,10 @@ def parse_arguments(default_values):
         {"prog": "%(prog)s", "version": __version__, "author": __author__}
 
     parser = argparse.ArgumentParser(
-        description="NRPE plugin to monitor Linux network traffic")
+        description="NRPE plugin to monitor Linux network traffic",
+        epilog="The arguments can be read from a file with @FILE, one \
+               argument per line.",
+        fromfile_prefix_chars='@')
 
     parser.add_argument('-V', '--version', action='version',
                         help="shows program version", version=version_string)
@@ -410,6 +1188,10 @@ def parse_arguments(default_values):
                         default=default_values['data_file'],
                         help='specify an alternate data file \
                              (default: %(default)s)')
+    parser.add_argument('--cache-ttl', type=float, metavar='SECONDS',
+                        help='return the result of a previous run with the \
+                             same arguments if it is younger than SECONDS \
+                             (default: no cache)')
     parser.add_argument('-u', '--unit', default=default_values['unit'],
                         choices=unit_choices,
                         help='Specifies the unit to to display per seconds.\
@@ -453,14 +1235,193 @@ def parse_arguments(default_values):
     g_filter_x.add_argument('-X', '--excludere', nargs='*',
                             help='exclude interface specified by regexp')
 
+    g_softnet = parser.add_argument_group(
+        "softnet options", "Check the packets dropped and the time squeezes \
+        (NAPI budget exhausted) per second of every CPU from \
+        /proc/net/softnet_stat")
+    g_softnet.add_argument('--softnet', action='store_true',
+                           help='enable the softnet_stat check')
+    g_softnet.add_argument('--softnet-warning', type=float,
+                           default=default_values['softnet_warning'],
+                           help='events per second for value WARNING \
+                                (default: %(default)s)')
+    g_softnet.add_argument('--softnet-critical', type=float,
+                           default=default_values['softnet_critical'],
+                           help='events per second for value CRITICAL \
+                                (default: %(default)s)')
+
+    g_qdisc = parser.add_argument_group(
+        "qdisc options", "Check the backlog, the drops, the overlimits and \
+        the requeues of the root queueing discipline of the interfaces, \
+        dumped with netlink. The filtering options apply.")
+    g_qdisc.add_argument('--qdisc', action='store_true',
+                         help='enable the qdisc check')
+    g_qdisc.add_argument('--qdisc-warning', type=float,
+                         default=default_values['qdisc_warning'],
+                         help='drops per second for value WARNING \
+                              (default: %(default)s)')
+    g_qdisc.add_argument('--qdisc-critical', type=float,
+                         default=default_values['qdisc_critical'],
+                         help='drops per second for value CRITICAL \
+                              (default: %(default)s)')
+
+    g_anomaly = parser.add_argument_group(
+        "anomaly options", "Keep a baseline (mean and variance) of the rates \
+        of every interface in the data file and alert when the rate deviates \
+        from it")
+    g_anomaly.add_argument('--anomaly', action='store_true',
+                           help='enable the anomaly detection')
+    g_anomaly.add_argument('--anomaly-warning', type=float,
+                           default=default_values['anomaly_warning'],
+                           help='number of standard deviations for value \
+                                WARNING (default: %(default)s)')
+    g_anomaly.add_argument('--anomaly-critical', type=float,
+                           default=default_values['anomaly_critical'],
+                           help='number of standard deviations for value \
+                                CRITICAL (default: %(default)s)')
+    g_anomaly.add_argument('--anomaly-buckets',
+                           default=default_values['anomaly_buckets'],
+                           choices=['none', 'hour-of-day', 'hour-of-week'],
+                           help='keep one baseline per hour of the day or \
+                                per hour of the week, the data file grows \
+                                by about 2 kB and 14 kB per interface \
+                                (default: %(default)s)')
+    g_anomaly.add_argument('--anomaly-min-samples', type=int,
+                           default=default_values['anomaly_min_samples'],
+                           help='number of samples in the baseline before \
+                                alerting (default: %(default)s)')
+    g_anomaly.add_argument('--anomaly-min-deviation', type=float,
+                           default=default_values['anomaly_min_deviation'],
+                           help='minimum standard deviation in percent of \
+                                the bandwidth, avoids alerts on idle \
+                                interfaces (default: %(default)s)')
+
+    g_forecast = parser.add_argument_group(
+        "forecast options", "Keep a regression of the daily peak rate of \
+        every interface in the data file and alert when the peaks will \
+        reach the bandwidth soon")
+    g_forecast.add_argument('--forecast', action='store_true',
+                            help='enable the capacity forecast')
+    g_forecast.add_argument('--forecast-warning', type=float,
+                            default=default_values['forecast_warning'],
+                            help='days before the saturation for value \
+                                 WARNING (default: %(default)s)')
+    g_forecast.add_argument('--forecast-critical', type=float,
+                            default=default_values['forecast_critical'],
+                            help='days before the saturation for value \
+                                 CRITICAL (default: %(default)s)')
+    g_forecast.add_argument('--forecast-half-life', type=float,
+                            default=default_values['forecast_half_life'],
+                            help='age in days of the daily peaks weighting \
+                                 half as much as today (default: \
+                                 %(default)s)')
+    g_forecast.add_argument('--forecast-min-days', type=int,
+                            default=default_values['forecast_min_days'],
+                            help='number of days of peaks before \
+                                 forecasting (default: %(default)s)')
+
+    g_history = parser.add_argument_group("history options", "")
+    g_history.add_argument('--history', metavar='DATABASE',
+                           help='store the rates in the SQLite DATABASE')
+    g_history.add_argument('--history-retention', type=parse_duration,
+                           default=default_values['history_retention'],
+                           help='remove the samples older than \
+                                HISTORY_RETENTION seconds (or m, h, d, w) \
+                                (default: %(default)s)')
+    g_history.add_argument('--archive', metavar='FILE',
+                           help='append the counters to the compressed \
+                                archive FILE (about 2 bytes per counter \
+                                and per run)')
+    g_history.add_argument('--report', nargs='*', type=parse_report,
+                           help='add the percentile or the maximum of the \
+                                stored rates to the perfdata. Format: \
+                                "pPERCENT:PERIOD" or "max:PERIOD", \
+                                example: p95:24h')
+    g_history.add_argument('--report-thresholds', action='store_true',
+                           help='apply the thresholds to the reports instead \
+                                of the current rates')
+
+    g_stream = parser.add_argument_group(
+        "stream options", "Run forever and print the rates and the status \
+        of every interface every INTERVAL seconds, for exec-style agents. \
+        SIGHUP reads the arguments again (see @FILE), SIGTERM stops.")
+    g_stream.add_argument('--stream', type=float, metavar='INTERVAL',
+                          help='enable the stream mode')
+    g_stream.add_argument('--format', default='influx',
+                          choices=['influx', 'jsonl'],
+                          help='InfluxDB line protocol or JSON lines \
+                               (default: %(default)s)')
+
+    g_bench = parser.add_argument_group(
+        "benchmark options", "Measure the cost of the check on this host. \
+        The data file and the history are never written.")
+    g_bench.add_argument('--self-benchmark', action='store_true',
+                         help='run every phase of the check repeatedly and \
+                              report its wall time, CPU time, peak RSS and \
+                              RSS growth')
+    g_bench.add_argument('--benchmark-iterations', type=int,
+                         default=default_values['benchmark_iterations'],
+                         help='number of runs of every phase \
+                              (default: %(default)s)')
+
+    g_replay = parser.add_argument_group("replay options", "")
+    g_replay.add_argument('--proc-root', default='/proc',
+                          help='read the counters from an alternate proc \
+                               filesystem (default: %(default)s)')
+    g_replay.add_argument('--record', metavar='TRACE',
+                          help='append the current snapshot to the TRACE \
+                               file before checking')
+    g_replay.add_argument('--replay', metavar='TRACE',
+                          help='run the check against every snapshot of the \
+                               TRACE file as fast as possible and report \
+                               the throughput and the statuses')
+
     # p.add_argument('-B', '--total', action=store_true,
     #               help='calculate total of interfaces')
 
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.history and sqlite3 is None:
+        parser.error("--history requires the sqlite3 module")
+
+    if (args.report or args.report_thresholds) and not args.history:
+        parser.error("--report requires --history")
+
+    if args.replay and args.linktype:
+        parser.error("--linktype queries the live interfaces and cannot be "
+                     "used with --replay")
 
+    if args.replay and args.qdisc:
+        parser.error("--qdisc queries the live interfaces and cannot be "
+                     "used with --replay")
 
-def main(default_values):
-    """This main function is wayyyy too long"""
+    if args.replay and args.softnet:
+        parser.error("the traces do not record softnet_stat, --softnet "
+                     "cannot be used with --replay")
+
+    if args.stream:
+        ignored = [option for option, value in
+                   (('--softnet', args.softnet), ('--qdisc', args.qdisc),
+                    ('--anomaly', args.anomaly),
+                    ('--forecast', args.forecast),
+                    ('--history', args.history), ('--archive', args.archive),
+                    ('--record', args.record),
+                    ('--cache-ttl', args.cache_ttl),
+                    ('--self-benchmark', args.self_benchmark))
+                   if value]
+        if ignored:
+            parser.error("--stream only prints the traffic of the "
+                         "interfaces and cannot be used with %s" %
+                         ', '.join(ignored))
+
+    return args
+
+
+def check(args, default_values, clock=time.time):
+    """Runs the check described by *args* and returns a NagiosResult.
+       *clock* returns the current epoch and can be replaced to replay
+       recorded snapshots.
+    """
 
     #
     # Default values
@@ -468,8 +1429,6 @@ def main(default_values):
 
     # previous data
     if_data0 = None
-    # The temporary file where data will be stored between to metrics
-    args = parse_arguments(default_values)
 
     # this is a list of problems
     problems = []
@@ -480,10 +1439,30 @@ def main(default_values):
     # Read current data
     #
 
-    procnetdev1 = ProcNetDev().read()
-    uptime1 = uptime()
+    procnetdev1 = ProcNetDev(args.proc_root).read()
+    uptime1 = uptime(args.proc_root)
+    time1 = clock()
     traffic1 = ProcNetDev().parse(procnetdev1)
 
+    if args.record:
+        TraceFile(args.record).append(time1, uptime1, procnetdev1)
+
+    softnet1 = None
+    if args.softnet:
+        try:
+            softnet1 = ProcSoftnetStat(args.proc_root).parse()
+        except (IOError, OSError, ValueError):
+            nagios_result.messages.append("Cannot read softnet_stat.")
+            nagios_result.status = 'UNKNOWN'
+
+    qdisc1 = None
+    if args.qdisc:
+        try:
+            qdisc1 = NetlinkQdisc().parse()
+        except (IOError, OSError, socket.error):
+            nagios_result.messages.append("Cannot dump the qdiscs.")
+            nagios_result.status = 'UNKNOWN'
+
     #
     # Read previous data
     #
@@ -504,15 +1483,182 @@ def main(default_values):
         except IndexError:
             os.remove(args.data_file)
             if_data0 = None
-            time0 = time.time()
+            time0 = time1
+            datafile.sections = {}
             nagios_result.messages.append("Malformed data file, skipping run.")
         except ValueError:
             # This must be a script upgrade
             os.remove(args.data_file)
             if_data0 = None
-            time0 = time.time()
+            time0 = time1
+            datafile.sections = {}
             nagios_result.messages.append("Data file upgrade, skipping run.")
 
+    # the state kept between two runs
+    sections0 = datafile.sections
+    sections1 = {}
+    interfaces1 = set(traffic1)
+
+    #
+    # Data filtering and preparation
+    #
+
+    try:
+        filter_devices(args, traffic1, ifdetect)
+    except DeviceError as err:
+        traffic1 = dict()
+        message = str(err).replace("'", "")
+        nagios_result.messages.append(message)
+        nagios_result.status = 'CRITICAL'
+
+    #
+    # Data analysis
+    #
+
+    # the (interface, counter, time, rate) samples for the history
+    samples = []
+
+    if args.anomaly:
+        # the per interface and per counter [count, mean, M2] of each bucket
+        baseline = sections0.get('baseline', {})
+        bucket = baseline_bucket(time1, args.anomaly_buckets)
+        # the minimum standard deviation, in bytes per second
+        min_deviation = (float(args.anomaly_min_deviation) *
+                         args.bandwidth / convert_bytes(1.0, args.unit) / 100)
+
+    if args.forecast:
+        # the per interface and per counter forecast_update() stats
+        forecast = sections0.get('forecast', {})
+        forecast_services = []
+        day = int(time1 // 86400)
+        # the bandwidth in bytes per second
+        capacity = float(args.bandwidth) / convert_bytes(1.0, args.unit)
+
+    if not if_data0:
+        # The script did not gather the previous data.
+        # This might be the first run.
+        if not nagios_result.messages:
+            # TODO: what is the condition to go here?
+            nagios_result.messages.append("First run.")
+    else:
+        # get the time between the two metrics
+        elapsed_time = time1 - time0
+        for if_name, counter, traffic_value, nagios_service in \
+                traffic_services(if_data0, uptime0, traffic1, uptime1,
+                                 elapsed_time, args, default_values):
+            samples.append((if_name, counter['name'], time1,
+                            traffic_value))
+
+            if args.anomaly:
+                buckets = baseline.setdefault(if_name, {}).setdefault(
+                    counter['name'], {})
+                nagios_service.zscore = calc_zscore(
+                    buckets.get(bucket), traffic_value,
+                    args.anomaly_min_samples, min_deviation)
+                nagios_service.warn_zscore = args.anomaly_warning
+                nagios_service.crit_zscore = args.anomaly_critical
+                buckets[bucket] = welford_update(buckets.get(bucket),
+                                                 traffic_value)
+                if (nagios_service.zscore is not None and
+                        abs(nagios_service.zscore) >=
+                        args.anomaly_warning):
+                    nagios_result.messages.append(
+                        "%s z=%.2f" % (nagios_service.label,
+                                       nagios_service.zscore))
+
+            if args.forecast:
+                series = forecast.setdefault(if_name, {})
+                series[counter['name']] = forecast_update(
+                    series.get(counter['name']), day, traffic_value,
+                    args.forecast_half_life)
+                days = forecast_days(series[counter['name']], day, capacity,
+                                     args.forecast_min_days)
+                if days is not None:
+                    forecast_service = NagiosService()
+                    forecast_service.label = "forecast-" + \
+                        nagios_service.label
+                    forecast_service.value = days
+                    forecast_service.inverted = True
+                    forecast_service.warn_level = args.forecast_warning
+                    forecast_service.crit_level = args.forecast_critical
+                    forecast_service.max_level = ''
+                    forecast_services.append(forecast_service)
+
+            nagios_result.add(nagios_service,
+                              thresholds=not args.report_thresholds)
+
+    if args.forecast:
+        for forecast_service in forecast_services:
+            if forecast_service.status() != 'OK':
+                nagios_result.messages.append(
+                    "%s saturated in %.1f days" %
+                    (forecast_service.label[len("forecast-"):],
+                     forecast_service.value))
+            nagios_result.add(forecast_service)
+        # forget the interfaces removed from the system
+        for if_name in list(forecast):
+            if if_name not in interfaces1:
+                del forecast[if_name]
+        sections1['forecast'] = forecast
+
+    if args.anomaly:
+        # forget the interfaces removed from the system
+        for if_name in list(baseline):
+            if if_name not in interfaces1:
+                del baseline[if_name]
+        sections1['baseline'] = baseline
+
+    #
+    # softnet_stat analysis
+    #
+
+    if softnet1 is not None:
+        sections1['softnet_stat'] = softnet1
+        softnet0 = sections0.get('softnet_stat')
+        if softnet0:
+            for nagios_service in softnet_services(softnet0, uptime0,
+                                                   softnet1, uptime1,
+                                                   time1 - time0, args,
+                                                   default_values):
+                nagios_result.add(nagios_service)
+
+    #
+    # Archive
+    #
+
+    if args.archive:
+        try:
+            sections1['archive'] = ArchiveFile(args.archive).append(
+                time1, [counter['name']
+                        for counter in default_values['counters']],
+                traffic1, sections0.get('archive'))
+        except (IOError, OSError):
+            nagios_result.messages.append("Cannot write in %s." %
+                                          args.archive)
+            nagios_result.status = nagios_result.worst(nagios_result.status,
+                                                       'UNKNOWN')
+
+    #
+    # qdisc analysis
+    #
+
+    if qdisc1 is not None:
+        sections1['qdisc'] = qdisc1
+        qdisc0 = sections0.get('qdisc', {})
+        if qdisc0:
+            qdisc_uptime0, qdisc_elapsed_time = uptime0, time1 - time0
+        else:
+            qdisc_uptime0, qdisc_elapsed_time = None, None
+        # only keep the interfaces kept by the filtering options
+        for if_name in sorted(qdisc1):
+            if if_name not in traffic1:
+                continue
+            for nagios_service, thresholds in qdisc_services(
+                    if_name, qdisc0.get(if_name), qdisc_uptime0,
+                    qdisc1[if_name], uptime1, qdisc_elapsed_time,
+                    args, default_values):
+                nagios_result.add(nagios_service, thresholds=thresholds)
+
     #
     # Save current data
     #
@@ -521,108 +1667,586 @@ def main(default_values):
     datafile = DataFile(args.data_file)
     datafile.uptime = uptime1
     datafile.data = procnetdev1
+    datafile.sections = sections1
 
     try:
         datafile.write()
-    except IOError:
+        datafile.touch(time1)
+    except (IOError, OSError):
         nagios_result.messages.append("Cannot write in %s." % args.data_file)
         nagios_result.status = 'CRITICAL'
 
-    # parse data
-
     #
-    # Data filtering and preparation
+    # History
     #
 
-    # remove interfaces if needed
-    if args.exclude:
-        exclude_device(args.exclude, traffic1)
+    if args.history:
+        try:
+            history = HistoryStore(args.history)
+            try:
+                if samples:
+                    history.add(samples, time1 - args.history_retention)
+                for report in args.report or []:
+                    history_report(history, report, traffic1, time1,
+                                   nagios_result, args, default_values)
+            finally:
+                history.close()
+        except sqlite3.Error as err:
+            nagios_result.messages.append("Cannot use history %s: %s." %
+                                          (args.history, err))
+            nagios_result.status = nagios_result.worst(nagios_result.status,
+                                                       'UNKNOWN')
+
+    return nagios_result
+
+
+def traffic_services(if_data0, uptime0, traffic1, uptime1, elapsed_time,
+                     args, default_values):
+    """Returns the (interface, counter, rate in bytes per second,
+       NagiosService) of every counter of the interfaces of *traffic1*
+       that are also in the previous data *if_data0*
+    """
+    services = []
+    for if_name, if_data1 in traffic1.items():
 
-    if args.excludere:
-        excludere_device(args.excludere, traffic1)
+        if if_name not in if_data0:
+            # The interface was added between the last and the current run.
+            continue
 
-    if args.linktype:
-        ifdetect.linktype_filter(args.linktype, traffic1)
+        #
+        # Traffic calculation
+        #
 
-    # only keep the wanted interfaces if specified
-    if args.interfaces:
-        try:
-            specify_device(args.interfaces, traffic1)
-        except DeviceError as err:
-            traffic1 = dict()
-            message = str(err).replace("'", "")
-            nagios_result.messages.append(message)
-            nagios_result.status = 'CRITICAL'
+        for counter in default_values['counters']:
 
-    #
-    # Data analysis
-    #
-
-    if not if_data0:
-        # The script did not gather the previous data.
-        # This might be the first run.
-        if not nagios_result.messages:
-            # TODO: what is the condition to go here?
-            nagios_result.messages.append("First run.")
-    else:
-        # get the time between the two metrics
-        elapsed_time = time.time() - time0
-        for if_name, if_data1 in traffic1.items():
+            nagios_service = NagiosService()
+            nagios_service.label = counter['prefix'] + if_name
+            # calculate the bytes
+            traffic_value = calc_diff(if_data0[if_name][counter['name']],
+                                      uptime0,
+                                      if_data1[counter['name']],
+                                      uptime1)
 
-            if if_name not in if_data0:
-                # The interface was added between the last and the current run.
-                continue
+            # calculate the bytes per second
+            traffic_value /= elapsed_time
 
             #
-            # Traffic calculation
+            # Define service values
             #
 
-            for counter in default_values['counters']:
+            nagios_service.value = traffic_value
+            nagios_service.max_level = float(args.bandwidth)
+            # convert percent levels given by user into real values
+            nagios_service.warn_level = (float(args.warning) *
+                                         args.bandwidth / 100)
+            nagios_service.crit_level = (float(args.critical) *
+                                         args.bandwidth / 100)
 
-                nagios_service = NagiosService()
-                nagios_service.label = counter['prefix'] + if_name
-                # calculate the bytes
-                traffic_value = calc_diff(if_data0[if_name][counter['name']],
-                                          uptime0,
-                                          if_data1[counter['name']],
-                                          uptime1)
+            if args.unit != default_values['_system_unit']:
+                # convert to desired unit if asked
+                nagios_service.value = convert_bytes(nagios_service.value,
+                                                     args.unit)
 
-                # calculate the bytes per second
-                traffic_value /= elapsed_time
+            services.append((if_name, counter, traffic_value,
+                             nagios_service))
+    return services
 
-                #
-                # Define service values
-                #
 
-                nagios_service.value = traffic_value
-                nagios_service.max_level = float(args.bandwidth)
-                # convert percent levels given by user into real values
-                nagios_service.warn_level = (float(args.warning) *
-                                             args.bandwidth / 100)
-                nagios_service.crit_level = (float(args.critical) *
-                                             args.bandwidth / 100)
+def softnet_services(softnet0, uptime0, softnet1, uptime1, elapsed_time,
+                     args, default_values):
+    """Returns the NagiosServices of the per CPU and total rates of the
+       softnet_stat counters
+    """
+    services = []
+    for counter in default_values['softnet_counters']:
+        total = 0.0
+        for cpu in sorted(softnet1, key=lambda cpu: int(cpu[3:])):
+            if cpu not in softnet0:
+                # The CPU was brought online between the two runs
+                continue
+            value = calc_diff(softnet0[cpu][counter['name']], uptime0,
+                              softnet1[cpu][counter['name']], uptime1,
+                              ProcSoftnetStat.max_value) / elapsed_time
+            total += value
+            services.append(softnet_service("%s-%s" % (counter['prefix'],
+                                                       cpu), value, args))
+        services.append(softnet_service(counter['prefix'], total, args))
+    return services
+
+
+def softnet_service(label, value, args):
+    """Returns a NagiosService of a softnet_stat rate"""
+    nagios_service = NagiosService()
+    nagios_service.label = label
+    nagios_service.value = value
+    nagios_service.warn_level = args.softnet_warning
+    nagios_service.crit_level = args.softnet_critical
+    nagios_service.max_level = ''
+    return nagios_service
+
+
+def qdisc_services(if_name, qdisc0, uptime0, qdisc1, uptime1, elapsed_time,
+                   args, default_values):
+    """Returns the (NagiosService, thresholds) of the qdisc of *if_name*:
+       the gauges and, if the previous statistics *qdisc0* are known, the
+       rates of the counters.
+    """
+    services = []
+    for gauge in default_values['qdisc_gauges']:
+        nagios_service = NagiosService()
+        nagios_service.label = gauge['prefix'] + if_name
+        nagios_service.value = qdisc1[gauge['name']]
+        nagios_service.warn_level = ''
+        nagios_service.crit_level = ''
+        nagios_service.max_level = ''
+        services.append((nagios_service, False))
+
+    if qdisc0 is None:
+        return services
+
+    for counter in default_values['qdisc_counters']:
+        nagios_service = NagiosService()
+        nagios_service.label = counter['prefix'] + if_name
+        nagios_service.value = calc_diff(qdisc0[counter['name']], uptime0,
+                                         qdisc1[counter['name']], uptime1,
+                                         NetlinkQdisc.max_value) / elapsed_time
+        nagios_service.max_level = ''
+        if counter['thresholds']:
+            nagios_service.warn_level = args.qdisc_warning
+            nagios_service.crit_level = args.qdisc_critical
+        else:
+            nagios_service.warn_level = ''
+            nagios_service.crit_level = ''
+        services.append((nagios_service, counter['thresholds']))
+    return services
+
+
+def history_report(history, report, traffic, now, nagios_result, args,
+                   default_values):
+    """Adds to *nagios_result* the *report* of every interface of
+       *traffic* computed from the *history*
+    """
+    for if_name in traffic:
+        for counter in default_values['counters']:
+            value = history.query(if_name, counter['name'],
+                                  now - report['period'], report)
+            if value is None:
+                continue
 
-                if args.unit != default_values['_system_unit']:
-                    # convert to desired unit if asked
-                    nagios_service.value = convert_bytes(nagios_service.value,
-                                                         args.unit)
+            nagios_service = NagiosService()
+            nagios_service.label = "%s%s_%s" % (counter['prefix'], if_name,
+                                                report['name'])
+            nagios_service.value = value
+            nagios_service.max_level = float(args.bandwidth)
+            nagios_service.warn_level = (float(args.warning) *
+                                         args.bandwidth / 100)
+            nagios_service.crit_level = (float(args.critical) *
+                                         args.bandwidth / 100)
 
-                nagios_result.add(nagios_service)
+            if args.unit != default_values['_system_unit']:
+                nagios_service.value = convert_bytes(nagios_service.value,
+                                                     args.unit)
+
+            nagios_result.add(nagios_service,
+                              thresholds=args.report_thresholds)
+
+
+def cache_key(args):
+    """Returns a key identifying the effective arguments of the check"""
+    effective_args = dict((name, value) for name, value in vars(args).items()
+                          if name not in ('cache_ttl', 'record'))
+    return hashlib.sha1(json.dumps(effective_args, sort_keys=True,
+                                   default=str).encode('utf-8')).hexdigest()
+
+
+def cached_check(args, default_values, clock=time.time):
+    """Returns the status and the output of the check described by *args*.
+       A result of the same arguments younger than *args.cache_ttl* seconds
+       is returned without running the check.
+    """
+    cache = ResultCache("%s.%s.cache" % (args.data_file, cache_key(args)[:16]))
+    try:
+        cache.lock()
+    except (IOError, OSError):
+        nagios_result = check(args, default_values, clock)
+        nagios_result.messages.append("Cannot write in %s." % cache.filename)
+        return nagios_result.status, str(nagios_result)
+
+    try:
+        cached = cache.read(args.cache_ttl, clock())
+        if cached:
+            return cached
+        nagios_result = check(args, default_values, clock)
+        cache.write(clock(), nagios_result.status, str(nagios_result))
+        return nagios_result.status, str(nagios_result)
+    finally:
+        cache.unlock()
+
+
+def replay(args, default_values):
+    """Feeds the snapshots of the *args.replay* trace file through the whole
+       check pipeline, using a temporary proc root and data file.
+       Returns the number of invocations, the elapsed time and the
+       number of results per status.
+    """
+    snapshots = TraceFile(args.replay).read()
+
+    proc_root = tempfile.mkdtemp(prefix='check_iftraffic_replay.')
+    os.mkdir(os.path.join(proc_root, 'net'))
+    replay_args = copy.copy(args)
+    replay_args.proc_root = proc_root
+    replay_args.data_file = os.path.join(proc_root, 'traffic_stats.dat')
+    replay_args.record = None
+    replay_args.replay = None
+    replay_args.cache_ttl = None
+    replay_args.archive = None
+    replay_args.history = None
+    replay_args.report = None
+    replay_args.report_thresholds = False
+
+    statuses = {}
+    try:
+        start = time.time()
+        for timestamp, uptime1, procnetdev1 in snapshots:
+            file_obj = open(os.path.join(proc_root, 'net', 'dev'), 'w')
+            file_obj.write(procnetdev1)
+            file_obj.close()
+            file_obj = open(os.path.join(proc_root, 'uptime'), 'w')
+            file_obj.write("%s 0.00\n" % uptime1)
+            file_obj.close()
+
+            nagios_result = check(replay_args, default_values,
+                                  clock=lambda timestamp=timestamp: timestamp)
+            statuses[nagios_result.status] = \
+                statuses.get(nagios_result.status, 0) + 1
+        elapsed_time = time.time() - start
+    finally:
+        shutil.rmtree(proc_root)
+
+    return len(snapshots), elapsed_time, statuses
+
+
+def influx_escape(value):
+    """Escapes an InfluxDB line protocol tag value"""
+    for char in '\\, =':
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def format_services(output_format, timestamp, services, args):
+    """Returns the lines describing the traffic_services() *services* in the
+       *output_format* ("influx" or "jsonl")
+    """
+    status_codes = NagiosResult('').status_codes
+    lines = []
+    for if_name, counter, _, nagios_service in services:
+        status = nagios_service.status()
+        if output_format == 'influx':
+            lines.append("iftraffic,interface=%s,counter=%s,unit=%s "
+                         "value=%r,status=%di %d\n" %
+                         (influx_escape(if_name), counter['name'], args.unit,
+                          float(nagios_service.value), status_codes[status],
+                          int(timestamp * 1e9)))
+        else:
+            lines.append(json.dumps({'time': timestamp,
+                                     'interface': if_name,
+                                     'counter': counter['name'],
+                                     'label': nagios_service.label,
+                                     'value': nagios_service.value,
+                                     'unit': args.unit,
+                                     'status': status},
+                                    sort_keys=True) + "\n")
+    return "".join(lines)
+
+
+def stream(args, default_values, argv=None, output=sys.stdout,
+           clock=time.time, sleep=None, iterations=None):
+    """Prints the traffic of the interfaces every *args.stream* seconds
+       until SIGTERM or SIGINT, or *iterations* samples.
+       The previous sample is kept in memory and the files of /proc are
+       opened once. SIGHUP parses *argv* again.
+       The signals are only handled between two samples, so a batch is
+       never interrupted.
+    """
+    reload_args = []
+    stop_stream = []
+
+    def stop(signum, frame):
+        stop_stream.append(signum)
+
+    if sleep is None:
+        def sleep(seconds):
+            """Sleeps *seconds* seconds or until a stop signal"""
+            end = time.time() + seconds
+            while not stop_stream and time.time() < end:
+                time.sleep(min(end - time.time(), 1.0))
+
+    def hangup(signum, frame):
+        reload_args.append(signum)
+
+    handlers = {signal.SIGTERM: stop, signal.SIGINT: stop,
+                signal.SIGHUP: hangup}
+    previous_handlers = dict((signum, signal.signal(signum, handler))
+                             for signum, handler in handlers.items())
+
+    ifdetect = InterfaceDetection()
+    netdev_file = open(ProcNetDev(args.proc_root).filename, 'r')
+    uptime_file = open(os.path.join(args.proc_root, 'uptime'), 'r')
+    previous = None
+    next_time = clock()
+    count = 0
+    try:
+        while not stop_stream:
+            if reload_args:
+                del reload_args[:]
+                try:
+                    new_args = parse_arguments(default_values, argv)
+                except SystemExit:
+                    sys.stderr.write("Cannot parse the arguments, keeping "
+                                     "the previous ones.\n")
+                else:
+                    if new_args.stream:
+                        args = new_args
+                    else:
+                        sys.stderr.write("The arguments do not define "
+                                         "--stream, keeping the previous "
+                                         "ones.\n")
+                netdev_file.close()
+                uptime_file.close()
+                netdev_file = open(ProcNetDev(args.proc_root).filename, 'r')
+                uptime_file = open(os.path.join(args.proc_root, 'uptime'),
+                                   'r')
+
+            netdev_file.seek(0)
+            uptime_file.seek(0)
+            traffic1 = ProcNetDev().parse(netdev_file.read())
+            uptime1 = float(uptime_file.readline().split()[0])
+            time1 = clock()
+
+            if previous is not None and time1 > previous[2]:
+                traffic = dict(traffic1)
+                try:
+                    filter_devices(args, traffic, ifdetect)
+                except DeviceError as err:
+                    traffic = dict()
+                    sys.stderr.write("%s\n" % str(err).replace("'", ""))
+                services = traffic_services(previous[0], previous[1], traffic,
+                                            uptime1, time1 - previous[2],
+                                            args, default_values)
+                # one write per interval
+                output.write(format_services(args.format, time1, services,
+                                             args))
+                output.flush()
+            previous = (traffic1, uptime1, time1)
+
+            count += 1
+            if iterations is not None and count >= iterations:
+                break
+            next_time += args.stream
+            if next_time < clock():
+                # skip the intervals missed during a stall instead of
+                # sampling them back to back
+                next_time = clock() + args.stream
+            if not stop_stream:
+                sleep(max(0.0, next_time - clock()))
+    finally:
+        netdev_file.close()
+        uptime_file.close()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+
+
+def memory_status():
+    """Returns the VmRSS (current) and VmHWM (peak) memory of the process
+       in kB
+    """
+    memory = {}
+    file_obj = open('/proc/self/status', 'r')
+    for line in file_obj:
+        name, value = line.split(':', 1)
+        if name in ('VmRSS', 'VmHWM'):
+            memory[name] = int(value.split()[0])
+    file_obj.close()
+    return memory
+
+
+def reset_peak_rss():
+    """Resets the VmHWM of the process to its current RSS (Linux >= 4.0).
+       Returns False if it is not possible.
+    """
+    try:
+        file_obj = open('/proc/self/clear_refs', 'w')
+        file_obj.write('5')
+        file_obj.close()
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def self_benchmark(args, default_values):
+    """Runs every phase of the check *args.benchmark_iterations* times
+       against the live system and a temporary data file.
+       Returns a list of (phase, wall times, cpu times, peak RSS in kB,
+       RSS growth in kB) and the output of the check.
+    """
+    bench_dir = tempfile.mkdtemp(prefix='check_iftraffic_benchmark.')
+    bench_args = copy.copy(args)
+    bench_args.data_file = os.path.join(bench_dir, 'traffic_stats.dat')
+    bench_args.history = None
+    bench_args.report = None
+    bench_args.report_thresholds = False
+    bench_args.record = None
+    bench_args.cache_ttl = None
+    bench_args.archive = None
+
+    content = ProcNetDev(args.proc_root).read()
+    interfaces = list(ProcNetDev().parse(content))
+    ifdetect = InterfaceDetection()
+
+    phases = [
+        ('read', lambda: (ProcNetDev(args.proc_root).read(),
+                          uptime(args.proc_root))),
+        ('parse', lambda: ProcNetDev().parse(content)),
+        ('linktype', lambda: [ifdetect.query_linktype(if_name)
+                              for if_name in interfaces])]
+    if args.softnet:
+        phases.append(('softnet', lambda: ProcSoftnetStat(
+            args.proc_root).parse()))
+    if args.qdisc:
+        phases.append(('qdisc', lambda: NetlinkQdisc().parse()))
+    phases.append(('check', lambda: check(bench_args, default_values)))
+
+    # os.times() only has a resolution of a clock tick
+    cpu_clock = getattr(time, 'process_time', lambda: sum(os.times()[:2]))
+
+    results = []
+    try:
+        for phase, function in phases:
+            wall_times = []
+            cpu_times = []
+            peak_reset = reset_peak_rss()
+            rss_start = memory_status()['VmRSS']
+            try:
+                for _ in range(args.benchmark_iterations):
+                    cpu_start = cpu_clock()
+                    start = time.time()
+                    function()
+                    wall_times.append(time.time() - start)
+                    cpu_times.append(cpu_clock() - cpu_start)
+            except (IOError, OSError, socket.error):
+                # ex: no SIOCGIFHWADDR support or no netlink
+                continue
+            memory = memory_status()
+            # without the reset, VmHWM is the peak of the whole process
+            peak_rss = memory['VmHWM'] if peak_reset else memory['VmRSS']
+            results.append((phase, wall_times, cpu_times, peak_rss,
+                            memory['VmRSS'] - rss_start))
+        output = str(check(bench_args, default_values))
+    finally:
+        shutil.rmtree(bench_dir)
+    return results, output
+
+
+def percentile(values, percent):
+    """Returns the *percent* percentile (nearest rank) of *values*"""
+    values = sorted(values)
+    rank = max(int(-(-percent * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def benchmark_recommendations(results, output_size, args):
+    """Returns the advices matching the *results* of self_benchmark()"""
+    medians = dict((phase, percentile(wall_times, 50))
+                   for phase, wall_times, _, _, _ in results)
+    recommendations = []
+    if medians.get('linktype', 0) > 0.01:
+        recommendations.append(
+            "The linktype detection takes %.1f ms: prefer the -i, -x or -X "
+            "filters to -l." % (medians['linktype'] * 1000))
+    if medians.get('check', 0) > 0.1:
+        recommendations.append(
+            "The check takes %.1f ms: use --cache-ttl if several pollers "
+            "run it." % (medians['check'] * 1000))
+    if medians.get('parse', 0) > medians.get('read', 0) and \
+            not (args.interfaces or args.exclude or args.excludere):
+        recommendations.append(
+            "Parsing dominates the reading of /proc/net/dev: only the "
+            "filtered interfaces are reported, use -i, -x or -X.")
+    if output_size > 1024:
+        recommendations.append(
+            "The output is %d bytes: NRPE 2.x truncates it at 1024 bytes, "
+            "reduce the interfaces with -i, -x or -X." % output_size)
+    return recommendations
+
+
+def main(default_values, argv=None):
+    """Parses the arguments, runs the check and exits with its status"""
+    args = parse_arguments(default_values, argv)
+
+    if args.replay:
+        invocations, elapsed_time, statuses = replay(args, default_values)
+        rate = invocations / elapsed_time if elapsed_time else 0.0
+        print("Replay: %d invocations in %.3fs (%.1f invocations/s) %s" %
+              (invocations, elapsed_time, rate,
+               ' '.join("%s=%d" % (status, statuses[status])
+                        for status in NagiosResult('').status_order
+                        if status in statuses)))
+        sys.exit(0)
+
+    if args.stream:
+        stream(args, default_values, argv)
+        sys.exit(0)
+
+    if args.self_benchmark:
+        results, output = self_benchmark(args, default_values)
+        print("%-10s %10s %10s %10s %10s %12s %10s" %
+              ('phase', 'min ms', 'median ms', 'p99 ms', 'cpu ms',
+               'peak RSS kB', 'RSS +kB'))
+        for phase, wall_times, cpu_times, peak_rss, rss_growth in results:
+            print("%-10s %10.3f %10.3f %10.3f %10.3f %12d %10d" %
+                  (phase, min(wall_times) * 1000,
+                   percentile(wall_times, 50) * 1000,
+                   percentile(wall_times, 99) * 1000,
+                   sum(cpu_times) / len(cpu_times) * 1000, peak_rss,
+                   rss_growth))
+        for recommendation in benchmark_recommendations(results, len(output),
+                                                        args):
+            print(recommendation)
+        sys.exit(0)
+
+    if args.cache_ttl:
+        status, output = cached_check(args, default_values)
+    else:
+        nagios_result = check(args, default_values)
+        status, output = nagios_result.status, str(nagios_result)
 
     #
     # Program output
     #
 
-    print(nagios_result)
-    nagios_result.exit()
+    print(output)
+    sys.exit(NagiosResult('').status_codes[status])
 
-if __name__ == '__main__':
+
+def get_default_values():
+    """Returns the default values of the program"""
     default_values = {}
     default_values["warning"] = 85
     default_values["critical"] = 98
     default_values["data_file"] = '/var/tmp/traffic_stats.dat'
     default_values["bandwidth"] = 1000 * 1000 * 100 / 8
     default_values["bandwidth_descr"] = "100 Mbps"
+    default_values["history_retention"] = 31 * 86400
+    default_values["benchmark_iterations"] = 100
+    default_values["forecast_warning"] = 30.0
+    default_values["forecast_critical"] = 7.0
+    default_values["forecast_half_life"] = 30.0
+    default_values["forecast_min_days"] = 7
+    default_values["anomaly_warning"] = 3.0
+    default_values["anomaly_critical"] = 5.0
+    default_values["anomaly_buckets"] = 'none'
+    default_values["anomaly_min_samples"] = 10
+    default_values["anomaly_min_deviation"] = 1.0
     # the traffic unit from /proc/net/dev
     default_values['_system_unit'] = 'Bps'
     default_values['unit'] = default_values['_system_unit']
@@ -632,4 +2256,27 @@ if __name__ == '__main__':
         {"name": "tx_bytes", "prefix": "out-", "column": 8}
     ]
 
-    main(default_values)
+    default_values["qdisc_warning"] = 1.0
+    default_values["qdisc_critical"] = 10.0
+    default_values["qdisc_gauges"] = [
+        {"name": "backlog", "prefix": "qdisc-backlog-"},
+        {"name": "qlen", "prefix": "qdisc-qlen-"}
+    ]
+    default_values["qdisc_counters"] = [
+        {"name": "drops", "prefix": "qdisc-drops-", "thresholds": True},
+        {"name": "overlimits", "prefix": "qdisc-overlimits-",
+         "thresholds": False},
+        {"name": "requeues", "prefix": "qdisc-requeues-", "thresholds": False}
+    ]
+
+    default_values["softnet_warning"] = 1.0
+    default_values["softnet_critical"] = 10.0
+    default_values["softnet_counters"] = [
+        {"name": "dropped", "prefix": "softnet-dropped", "column": 1},
+        {"name": "time_squeeze", "prefix": "softnet-squeeze", "column": 2}
+    ]
+    return default_values
+
+
+if __name__ == '__main__':
+    main(get_default_values())
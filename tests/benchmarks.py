@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Benchmarks of the compressed archive (ArchiveFile).
+
+Simulates a day of one minute runs on 1000 interfaces and prints the
+bytes per sample, the encode and decode throughput and the time to read
+back the last hour.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__) + '/..')
+import check_iftraffic_nrpe as myscript
+
+INTERFACES = 1000
+RUNS = 24 * 60
+INTERVAL = 60
+COUNTERS = ['rx_bytes', 'tx_bytes']
+
+
+def main():
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    archive = myscript.ArchiveFile(os.path.join(directory, 'archive'))
+
+    # steady rates with some noise and an occasional jitter of the runs
+    rates = dict(("eth%d" % index, random.randint(0, 10 ** 7))
+                 for index in range(INTERFACES))
+    data = dict((if_name, dict((counter, 0) for counter in COUNTERS))
+                for if_name in rates)
+
+    try:
+        state = None
+        encode_time = 0.0
+        start_time = 1500000000
+        for run in range(RUNS):
+            for if_name, rate in rates.items():
+                for counter in COUNTERS:
+                    data[if_name][counter] += rate * INTERVAL + \
+                        random.randint(0, rate // 100 + 1)
+            timestamp = start_time + run * INTERVAL + random.random() * 0.01
+            start = time.time()
+            state = archive.append(timestamp, COUNTERS, data, state)
+            encode_time += time.time() - start
+
+        samples = RUNS * INTERFACES * len(COUNTERS)
+        size = os.path.getsize(archive.filename)
+        print("%d runs of %d interfaces: %d bytes, %.2f bytes per sample" %
+              (RUNS, INTERFACES, size, float(size) / samples))
+        print("encode: %.0f samples/s" % (samples / encode_time))
+
+        start = time.time()
+        count = sum(1 for _ in archive.read())
+        decode_time = time.time() - start
+        print("decode: %.0f samples/s" %
+              (count * INTERFACES * len(COUNTERS) / decode_time))
+
+        start = time.time()
+        last_hour = list(archive.read(since=timestamp - 3600))
+        print("read the last hour (%d runs): %.1f ms" %
+              (len(last_hour), (time.time() - start) * 1000))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 #!/usr/bin/env python
 import os
+import json
+import shutil
+import signal
 import sys
+import tempfile
+import time
 import unittest
 
 
@@ -15,6 +20,10 @@ class ProcNetDev():
 """
 
 import struct
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 ARCH = struct.calcsize("P") * 8
 
 class Max_Counter(unittest.TestCase):
@@ -50,6 +59,9 @@ class Calc_Diff(unittest.TestCase):
             value1 = 2**64 - 1
         value2 = 0
         self.assertEqual(myscript.calc_diff(value1, uptime1, value2, uptime2), 1)
+    def test_max_value(self):
+        # 32 bits counters
+        self.assertEqual(myscript.calc_diff(2**32 - 2, 9, 3, 10, 2**32 - 1), 5)
     def test_reboot(self):
         # the host rebooted, uptime2 is smaller than uptime1: must take latest value possible
         value1, uptime1, value2, uptime2 = 123, 10, 345, 5
@@ -213,6 +225,15 @@ class Data_File(unittest.TestCase):
             os.unlink(self.filename)
         self.assertRaises(IOError, self.datafile.read)
 
+    def test_sections(self):
+        self.datafile.sections = {'baseline': {'eth0': [1, 2.5, 0.0]}}
+        self.write_datafile()
+        datafile = myscript.DataFile(self.filename)
+        uptime0, procnetdev0 = datafile.read()
+        self.parse_data(uptime0, procnetdev0)
+        self.assertNotIn('#', procnetdev0)
+        self.assertEqual(datafile.sections, {'baseline': {'eth0': [1, 2.5, 0.0]}})
+
     def test_read_malformed_datafile(self):
         f = open(self.filename, 'w')
         f.write('This is the content of a malformed datafile')
@@ -230,6 +251,680 @@ class Data_File(unittest.TestCase):
         self.assertRaises(IOError,self.write_datafile)
 
 
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+%s"""
+
+
+def net_dev(**interfaces):
+    """Builds a /proc/net/dev content with the given (rx, tx) bytes"""
+    lines = []
+    for if_name, (rx_bytes, tx_bytes) in sorted(interfaces.items()):
+        lines.append("%6s: %d 0 0 0 0 0 0 0 %d 0 0 0 0 0 0 0" %
+                     (if_name, rx_bytes, tx_bytes))
+    return NET_DEV % "\n".join(lines)
+
+
+class Proc_Root(unittest.TestCase):
+
+    def setUp(self):
+        self.proc_root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.proc_root, 'net'))
+        self.default_values = myscript.get_default_values()
+        self.data_file = os.path.join(self.proc_root, 'traffic_stats.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.proc_root)
+
+    def write_proc(self, uptime, content):
+        f = open(os.path.join(self.proc_root, 'uptime'), 'w')
+        f.write("%s 0.00\n" % uptime)
+        f.close()
+        f = open(os.path.join(self.proc_root, 'net', 'dev'), 'w')
+        f.write(content)
+        f.close()
+
+    def run_check(self, timestamp, *argv):
+        args = myscript.parse_arguments(
+            self.default_values,
+            ['--proc-root', self.proc_root, '-f', self.data_file] + list(argv))
+        return myscript.check(args, self.default_values,
+                              clock=lambda: timestamp)
+
+    def test_uptime(self):
+        self.write_proc(42.5, net_dev(eth0=(0, 0)))
+        self.assertEqual(myscript.uptime(self.proc_root), 42.5)
+
+    def test_rates(self):
+        self.write_proc(100, net_dev(eth0=(1000, 0)))
+        self.assertEqual(self.run_check(1000).status, 'UNKNOWN')
+        self.write_proc(110, net_dev(eth0=(21000, 500)))
+        result = self.run_check(1010)
+        self.assertEqual(result.status, 'OK')
+        self.assertIn('in-eth0=2000.00;', str(result))
+        self.assertIn('out-eth0=50.00;', str(result))
+
+    def test_reboot(self):
+        self.write_proc(100, net_dev(eth0=(10 ** 9, 0)))
+        self.run_check(1000)
+        self.write_proc(10, net_dev(eth0=(1000, 0)))
+        self.assertIn('in-eth0=100.00;', str(self.run_check(1010)))
+
+    def test_interface_added(self):
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        self.run_check(1000)
+        self.write_proc(110, net_dev(eth0=(0, 0), eth1=(10 ** 9, 0)))
+        result = self.run_check(1010)
+        self.assertEqual(result.status, 'OK')
+        self.assertNotIn('eth1', str(result))
+
+    def test_history_report(self):
+        history = os.path.join(self.proc_root, 'history.db')
+        for i in range(4):
+            self.write_proc(100 + i * 10, net_dev(eth0=(i * i * 1000, 0)))
+            result = self.run_check(1000 + i * 10, '--history', history,
+                                    '--report', 'p50:1h', 'max:1h')
+        self.assertIn('in-eth0_p50_1h=300.00;', str(result))
+        self.assertIn('in-eth0_max_1h=500.00;', str(result))
+
+    def test_history_report_thresholds(self):
+        history = os.path.join(self.proc_root, 'history.db')
+        argv = ['--history', history, '--report', 'max:1h', '-b', '1000']
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        self.run_check(1000, *argv)
+        self.write_proc(110, net_dev(eth0=(10 ** 5, 0)))
+        self.run_check(1010, *argv)
+        self.write_proc(120, net_dev(eth0=(10 ** 5, 0)))
+        self.assertEqual(self.run_check(1020, *argv).status, 'OK')
+        self.assertEqual(self.run_check(1030, '--report-thresholds', *argv).status,
+                         'CRITICAL')
+
+    def test_anomaly(self):
+        argv = ['--anomaly', '--anomaly-buckets', 'none',
+                '--anomaly-min-samples', '5', '--anomaly-min-deviation', '0']
+        rx_bytes = 0
+        for i in range(12):
+            rx_bytes += 1000 + 100 * (i % 2)
+            self.write_proc(100 + i * 10, net_dev(eth0=(rx_bytes, 0)))
+            self.assertNotEqual(self.run_check(1000 + i * 10, *argv).status,
+                                'CRITICAL')
+        self.write_proc(220, net_dev(eth0=(rx_bytes + 5000, 0)))
+        result = self.run_check(1120, *argv)
+        self.assertEqual(result.status, 'CRITICAL')
+        self.assertIn('in-eth0 z=', str(result))
+        baseline = myscript.DataFile(self.data_file)
+        baseline.read()
+        self.assertEqual(baseline.sections['baseline']['eth0']['rx_bytes']['0'][0], 12)
+
+    def test_anomaly_default_size(self):
+        # the default baseline stays a few hundred bytes per interface
+        for i in range(3):
+            self.write_proc(100 + i * 10, net_dev(eth0=(i * 1000, i * 500)))
+            self.run_check(1000 + i * 3600, '--anomaly')
+        datafile = myscript.DataFile(self.data_file)
+        datafile.read()
+        self.assertLess(len(json.dumps(datafile.sections['baseline']['eth0'])), 300)
+
+    def test_softnet(self):
+        softnet_stat = os.path.join(self.proc_root, 'net', 'softnet_stat')
+        f = open(softnet_stat, 'w')
+        f.write("00000000 fffffff0 00000000 00000000 00000000 00000000 00000000 00000000 00000000\n"
+                "00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000\n")
+        f.close()
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        self.run_check(1000, '--softnet')
+        f = open(softnet_stat, 'w')
+        f.write("00000000 00000010 00000000 00000000 00000000 00000000 00000000 00000000 00000000\n"
+                "00000000 00000000 00000014 00000000 00000000 00000000 00000000 00000000 00000000\n")
+        f.close()
+        self.write_proc(110, net_dev(eth0=(0, 0)))
+        result = self.run_check(1010, '--softnet')
+        self.assertEqual(result.status, 'WARNING')
+        self.assertIn('softnet-dropped-cpu0=3.20;', str(result))
+        self.assertIn('softnet-squeeze-cpu1=2.00;', str(result))
+        self.assertIn('softnet-dropped=3.20;', str(result))
+
+    def test_softnet_malformed_data_file(self):
+        softnet_stat = os.path.join(self.proc_root, 'net', 'softnet_stat')
+        f = open(softnet_stat, 'w')
+        f.write("00000000 00000010 00000000 00000000 00000000 00000000 00000000 00000000 00000000\n")
+        f.close()
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        self.run_check(1000, '--softnet')
+        # the counters are corrupt but the softnet_stat section is valid
+        f = open(self.data_file)
+        lines = f.read().splitlines()
+        f.close()
+        f = open(self.data_file, 'w')
+        f.write("\n".join([lines[0], 'eth0: corrupt'] +
+                          [line for line in lines if line.startswith('#')]) + "\n")
+        f.close()
+        self.write_proc(110, net_dev(eth0=(0, 0)))
+        result = self.run_check(1010, '--softnet')
+        self.assertIn('skipping run.', str(result))
+        self.assertNotIn('softnet-dropped', str(result))
+
+    def test_cache(self):
+        argv = ['--cache-ttl', '60']
+        args = myscript.parse_arguments(
+            self.default_values,
+            ['--proc-root', self.proc_root, '-f', self.data_file] + argv)
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        myscript.check(args, self.default_values, clock=lambda: 1000)
+        self.write_proc(110, net_dev(eth0=(1000, 0)))
+        status, output = myscript.cached_check(args, self.default_values,
+                                               clock=lambda: 1010)
+        self.assertEqual(status, 'OK')
+
+        # the cached result is returned without reading /proc
+        os.unlink(os.path.join(self.proc_root, 'net', 'dev'))
+        self.assertEqual(myscript.cached_check(args, self.default_values,
+                                               clock=lambda: 1069),
+                         (status, output))
+        self.assertRaises(IOError, myscript.cached_check, args,
+                          self.default_values, clock=lambda: 1070)
+
+        # other arguments do not share the cache
+        other_args = myscript.parse_arguments(
+            self.default_values,
+            ['--proc-root', self.proc_root, '-f', self.data_file, '-w', '50'] + argv)
+        self.assertRaises(IOError, myscript.cached_check, other_args,
+                          self.default_values, clock=lambda: 1011)
+
+    def stream(self, *argv, **kwargs):
+        # every sleep moves the clock forward and changes the counters
+        state = {'time': 1000.0, 'rx_bytes': 0}
+        signum = kwargs.get('signum')
+
+        def clock():
+            return state['time']
+
+        def sleep(seconds):
+            state['time'] += seconds
+            state['rx_bytes'] += 5000
+            self.write_proc(state['time'] - 900, net_dev(eth0=(state['rx_bytes'], 0),
+                                                         lo=(0, 0)))
+            if signum is not None:
+                os.kill(os.getpid(), signum)
+
+        self.write_proc(100, net_dev(eth0=(0, 0), lo=(0, 0)))
+        argv = ['--proc-root', self.proc_root, '--stream', '10'] + list(argv)
+        args = myscript.parse_arguments(self.default_values, argv)
+        output = StringIO()
+        myscript.stream(args, self.default_values,
+                        kwargs.get('reload_argv', argv), output=output,
+                        clock=clock, sleep=sleep, iterations=3)
+        return output.getvalue().splitlines()
+
+    def test_stream_influx(self):
+        lines = self.stream('-i', 'eth0', '-b', '580')
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0], 'iftraffic,interface=eth0,counter=rx_bytes,unit=Bps '
+                                   'value=500.0,status=1i 1010000000000')
+        self.assertTrue(lines[3].endswith(' 1020000000000'))
+
+    def test_stream_jsonl(self):
+        lines = [json.loads(line) for line in self.stream('--format', 'jsonl', '-x', 'lo')]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0]['label'], 'in-eth0')
+        self.assertEqual(lines[0]['value'], 500.0)
+        self.assertEqual(lines[0]['status'], 'OK')
+
+    def test_forecast(self):
+        argv = ['--forecast', '--forecast-min-days', '3', '-b', '10000']
+        rx_bytes = 0
+        for day in range(6):
+            # one hour at 1000 + 1000 * day bytes per second every day
+            for hour in range(2):
+                rx_bytes += 3600 * (1000 + 1000 * day) * hour
+                timestamp = 86400 * (20000 + day) + 3600 * hour
+                self.write_proc(timestamp - 86400 * 20000 + 100,
+                                net_dev(eth0=(rx_bytes, 0)))
+                result = self.run_check(timestamp, *argv)
+        # the peaks reach 10000 bytes per second on day 9
+        self.assertIn('forecast-in-eth0=4.00;30.0:;7.0:;0;', str(result))
+        self.assertEqual(result.status, 'CRITICAL')
+        self.assertIn('in-eth0 saturated in 4.0 days', str(result))
+
+    def test_stream_reload_without_stream(self):
+        lines = self.stream('-i', 'eth0', signum=signal.SIGHUP,
+                            reload_argv=['--proc-root', self.proc_root])
+        self.assertEqual(len(lines), 4)
+
+    def test_stream_stall(self):
+        state = {'time': 1000.0, 'rx_bytes': 0}
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            # the first sleep stalls for 5 intervals
+            state['time'] += 50 if len(sleeps) == 1 else seconds
+            state['rx_bytes'] += 5000
+            self.write_proc(state['time'] - 900, net_dev(eth0=(state['rx_bytes'], 0)))
+
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        args = myscript.parse_arguments(
+            self.default_values, ['--proc-root', self.proc_root, '--stream', '10'])
+        myscript.stream(args, self.default_values, output=StringIO(),
+                        clock=lambda: state['time'], sleep=sleep, iterations=3)
+        self.assertEqual(sleeps, [10.0, 10.0])
+
+    def test_stream_reload_softnet(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            lines = self.stream('-i', 'eth0', signum=signal.SIGHUP,
+                                reload_argv=['--proc-root', self.proc_root,
+                                             '--stream', '10', '--softnet'])
+            errors = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(len(lines), 4)
+        self.assertIn('keeping the previous ones', errors)
+
+    def test_stream_stop(self):
+        # SIGTERM during the write of a batch stops the stream after it
+        class Output(StringIO):
+            def write(self, data):
+                os.kill(os.getpid(), signal.SIGTERM)
+                StringIO.write(self, data)
+
+        self.write_proc(100, net_dev(eth0=(0, 0), lo=(0, 0)))
+        argv = ['--proc-root', self.proc_root, '--stream', '10']
+        args = myscript.parse_arguments(self.default_values, argv)
+        output = Output()
+        clock = [1000.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        myscript.stream(args, self.default_values, argv, output=output,
+                        clock=lambda: clock[0], sleep=sleep)
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
+        self.assertTrue(output.getvalue().endswith("\n"))
+
+    def test_record_replay(self):
+        trace = os.path.join(self.proc_root, 'trace')
+        self.write_proc(100, net_dev(eth0=(0, 0)))
+        self.run_check(1000, '--record', trace)
+        self.write_proc(110, net_dev(eth0=(10 ** 6, 0)))
+        self.run_check(1010, '--record', trace)
+        self.write_proc(120, net_dev(eth0=(10 ** 9, 0)))
+        self.run_check(1020, '--record', trace)
+        self.assertEqual(len(myscript.TraceFile(trace).read()), 3)
+
+        archive = os.path.join(self.proc_root, 'archive')
+        history = os.path.join(self.proc_root, 'history.db')
+        args = myscript.parse_arguments(self.default_values,
+                                        ['--replay', trace, '-f', '/nonexistent/file',
+                                         '--archive', archive, '--history', history])
+        invocations, elapsed_time, statuses = \
+            myscript.replay(args, self.default_values)
+        self.assertEqual(invocations, 3)
+        self.assertEqual(statuses, {'UNKNOWN': 1, 'OK': 1, 'CRITICAL': 1})
+        self.assertFalse(os.path.exists(archive))
+        self.assertFalse(os.path.exists(history))
+
+    def test_replay_softnet(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertRaises(SystemExit, myscript.parse_arguments,
+                              self.default_values, ['--replay', 'trace', '--softnet'])
+        finally:
+            sys.stderr = stderr
+
+    def test_stream_ignored_options(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            for option in (['--softnet'], ['--qdisc'], ['--anomaly'], ['--forecast'],
+                           ['--history', 'db'], ['--archive', 'archive'], ['--record', 'trace'],
+                           ['--cache-ttl', '30'], ['--self-benchmark']):
+                self.assertRaises(SystemExit, myscript.parse_arguments,
+                                  self.default_values, ['--stream', '10'] + option)
+        finally:
+            sys.stderr = stderr
+
+
+class History_Store(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = myscript.HistoryStore(
+            os.path.join(self.directory, 'history.db'))
+        self.history.add([('eth0', 'rx_bytes', 1000 + t, float(t))
+                          for t in range(1, 101)])
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def test_percentile(self):
+        self.assertEqual(self.history.percentile('eth0', 'rx_bytes', 0, 95), 95)
+        self.assertEqual(self.history.percentile('eth0', 'rx_bytes', 0, 50), 50)
+        self.assertEqual(self.history.percentile('eth0', 'rx_bytes', 0, 0), 1)
+        self.assertEqual(self.history.percentile('eth0', 'rx_bytes', 1091, 50), 95)
+
+    def test_maximum(self):
+        self.assertEqual(self.history.maximum('eth0', 'rx_bytes', 0), 100)
+        self.assertEqual(self.history.maximum('eth0', 'rx_bytes', 1051), 100)
+        self.assertEqual(self.history.maximum('eth0', 'tx_bytes', 0), None)
+
+    def test_prune(self):
+        self.history.add([('eth0', 'rx_bytes', 1101, 0.0)], 1051)
+        self.assertEqual(self.history.count('eth0', 'rx_bytes', 0), 51)
+
+    def test_prune_removed_interface(self):
+        self.history.add([('veth123', 'rx_bytes', 100, 1.0)])
+        self.history.add([('eth0', 'rx_bytes', 1101, 0.0)], 1051)
+        self.assertEqual(self.history.count('veth123', 'rx_bytes', 0), 0)
+
+    def test_parse_report(self):
+        report = myscript.parse_report('p95:24h')
+        self.assertEqual(report['function'], 'percentile')
+        self.assertEqual(report['percent'], 95)
+        self.assertEqual(report['period'], 86400)
+        self.assertEqual(report['name'], 'p95_24h')
+        self.assertEqual(myscript.parse_report('max:30')['period'], 30)
+        self.assertRaises(Exception, myscript.parse_report, 'p101:1h')
+        self.assertRaises(Exception, myscript.parse_report, 'avg:1h')
+
+
+SOFTNET_STAT = """00000334 00000001 00000002 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000
+0000ffff 00000010 000000a0 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000000 00000002 00000000 00000000
+"""
+
+
+class Proc_Softnet_Stat(unittest.TestCase):
+
+    def test_parse(self):
+        cpus = myscript.ProcSoftnetStat().parse(SOFTNET_STAT)
+        self.assertEqual(sorted(cpus), ['cpu0', 'cpu2'])
+        self.assertEqual(cpus['cpu2'], {'processed': 0xffff, 'dropped': 16,
+                                        'time_squeeze': 160})
+
+    def test_parse_old_kernel(self):
+        content = "00000001 00000002 00000003 00000000 00000000 00000000 00000000 00000000 00000000 00000000\n" * 3
+        cpus = myscript.ProcSoftnetStat().parse(content)
+        self.assertEqual(sorted(cpus), ['cpu0', 'cpu1', 'cpu2'])
+        self.assertEqual(cpus['cpu1']['time_squeeze'], 3)
+
+    def test_parse_live(self):
+        if not os.path.exists('/proc/net/softnet_stat'):
+            self.skipTest('no /proc/net/softnet_stat')
+        self.assertTrue(myscript.ProcSoftnetStat().parse())
+
+
+def rtattr(attr_type, payload):
+    """Builds a netlink attribute"""
+    attr = struct.pack("=HH", 4 + len(payload), attr_type) + payload
+    return attr + b"\0" * (-len(attr) % 4)
+
+
+def qdisc_message(ifindex, parent, kind, qlen, backlog, drops, requeues, overlimits):
+    """Builds a RTM_NEWQDISC netlink message"""
+    stats2 = rtattr(1, struct.pack("=QII", 0, 0, 0)) + \
+        rtattr(3, struct.pack("=IIIII", qlen, backlog, drops, requeues, overlimits))
+    payload = struct.pack("=BxxxiIII", 0, ifindex, 0, parent, 1) + \
+        rtattr(1, kind + b"\0") + rtattr(7 | 0x8000, stats2)
+    return struct.pack("=IHHII", 16 + len(payload), 36, 2, 1, 0) + payload
+
+
+class Netlink_Qdisc(unittest.TestCase):
+
+    def test_parse(self):
+        data = qdisc_message(1, 0xFFFFFFFF, b"noqueue", 0, 0, 0, 0, 0) + \
+            qdisc_message(2, 0xFFFFFFFF, b"fq_codel", 3, 4500, 7, 1, 2) + \
+            qdisc_message(2, 0x10001, b"pfifo", 1, 1500, 5, 0, 0) + \
+            qdisc_message(3, 0xFFFFFFFF, b"mq", 1, 1, 1, 1, 1) + \
+            struct.pack("=IHHII", 20, 3, 2, 1, 0) + b"\0" * 4
+        qdiscs = myscript.NetlinkQdisc().parse(data, {1: 'lo', 2: 'eth0'})
+        self.assertEqual(sorted(qdiscs), ['eth0', 'lo'])
+        self.assertEqual(qdiscs['eth0'], {'qlen': 3, 'backlog': 4500, 'drops': 7,
+                                          'requeues': 1, 'overlimits': 2})
+
+    def test_services(self):
+        default_values = myscript.get_default_values()
+        args = myscript.parse_arguments(default_values, ['--qdisc'])
+        qdisc0 = {'qlen': 0, 'backlog': 0, 'drops': 2 ** 32 - 10,
+                  'requeues': 0, 'overlimits': 0}
+        qdisc1 = {'qlen': 2, 'backlog': 3000, 'drops': 10,
+                  'requeues': 0, 'overlimits': 40}
+        services = dict((str(service).split('=')[0], (service, thresholds))
+                        for service, thresholds in myscript.qdisc_services(
+                            'eth0', qdisc0, 10, qdisc1, 20, 10, args, default_values))
+        self.assertEqual(services['qdisc-backlog-eth0'][0].value, 3000)
+        self.assertEqual(services['qdisc-drops-eth0'][0].value, 2.0)
+        self.assertEqual(services['qdisc-drops-eth0'][0].status(), 'WARNING')
+        self.assertTrue(services['qdisc-drops-eth0'][1])
+        self.assertEqual(services['qdisc-overlimits-eth0'][0].value, 4.0)
+        self.assertFalse(services['qdisc-overlimits-eth0'][1])
+        self.assertEqual(len(myscript.qdisc_services(
+            'eth0', None, None, qdisc1, 20, None, args, default_values)), 2)
+
+    def test_dump(self):
+        try:
+            qdiscs = myscript.NetlinkQdisc().parse()
+        except (IOError, OSError) as err:
+            self.skipTest('netlink is not available: %s' % err)
+        self.assertIn('lo', qdiscs)
+        self.assertEqual(sorted(qdiscs['lo']), sorted(myscript.NetlinkQdisc.titles))
+
+
+class Archive_File(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = myscript.ArchiveFile(os.path.join(self.directory, 'archive'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def append(self, runs, keyframe_interval=60):
+        self.archive.keyframe_interval = keyframe_interval
+        data = {'eth0': {'rx_bytes': 2 ** 64 - 10, 'tx_bytes': 0},
+                'lo': {'rx_bytes': 0, 'tx_bytes': 0}}
+        samples = []
+        state = None
+        for run in range(runs):
+            data['eth0']['rx_bytes'] += 1000 + run
+            data['lo']['tx_bytes'] += 7
+            if run == 5:
+                # counter reset
+                data['eth0']['tx_bytes'] = 0
+            if run == 7:
+                data['eth1'] = {'rx_bytes': 1, 'tx_bytes': 2}
+            timestamp = 1000 + run * 60 + (run % 3) * 0.5
+            state = self.archive.append(timestamp, ['rx_bytes', 'tx_bytes'], data, state)
+            # the state must survive the data file
+            state = json.loads(json.dumps(state))
+            samples.append((timestamp, json.loads(json.dumps(data))))
+        return samples
+
+    def test_varint(self):
+        for value in [0, 1, -1, 63, -64, 64, 300, -300, 2 ** 64, -2 ** 64]:
+            buff = bytearray()
+            myscript.ArchiveFile.encode_varint(value, buff)
+            self.assertEqual(myscript.ArchiveFile.decode_varint(buff, 0),
+                             (value, len(buff)))
+
+    def test_read(self):
+        samples = self.append(20)
+        self.assertEqual(list(self.archive.read()), samples)
+
+    def test_range(self):
+        samples = self.append(30, keyframe_interval=4)
+        self.assertEqual(list(self.archive.read(1600, 2200)),
+                         [sample for sample in samples if 1600 <= sample[0] <= 2200])
+        self.assertEqual(list(self.archive.read(since=1000 + 25 * 60)), samples[25:])
+
+    def test_compression(self):
+        self.append(20)
+        size = os.path.getsize(self.archive.filename)
+        frames = list(self.archive.frames())
+        self.assertEqual([kind for kind, _ in frames].count(myscript.ArchiveFile.KEYFRAME), 2)
+        # the steady lo interface costs 1 byte per counter in the delta frames
+        self.assertLess(size, 20 * 8 * 2)
+
+    def test_append_after_torn_write(self):
+        data = {'eth0': {'rx_bytes': 0, 'tx_bytes': 0}}
+        state = None
+        for run in range(6):
+            if run == 3:
+                f = open(self.archive.filename, 'ab')
+                f.write(b'\x40\x01')
+                f.close()
+            data['eth0']['rx_bytes'] += 1000
+            state = self.archive.append(1000 + run * 60, ['rx_bytes', 'tx_bytes'],
+                                        data, state)
+        samples = list(self.archive.read())
+        self.assertEqual([sample[0] for sample in samples],
+                         [1000 + run * 60.0 for run in range(6)])
+        self.assertEqual(samples[-1][1]['eth0']['rx_bytes'], 6000)
+        self.assertEqual(os.path.getsize(self.archive.filename), state['size'])
+
+    def test_two_writers(self):
+        # two data files append to the same archive in turn
+        data = {'eth0': {'rx_bytes': 0, 'tx_bytes': 0}}
+        states = [None, None]
+        for run in range(20):
+            data['eth0']['rx_bytes'] += 1000
+            states[run % 2] = self.archive.append(
+                1000 + run * 60, ['rx_bytes', 'tx_bytes'], data, states[run % 2])
+        samples = list(self.archive.read())
+        self.assertEqual([sample[0] for sample in samples],
+                         [1000 + run * 60.0 for run in range(20)])
+        self.assertEqual([sample[1]['eth0']['rx_bytes'] for sample in samples],
+                         [1000 * (run + 1) for run in range(20)])
+
+    def test_truncated(self):
+        self.append(3)
+        f = open(self.archive.filename, 'ab')
+        f.write(b'\x40\x01')
+        f.close()
+        self.assertEqual(len(list(self.archive.read())), 3)
+
+
+class Forecast(unittest.TestCase):
+
+    def test_linear(self):
+        stats = None
+        for day in range(20000, 20010):
+            for value in [10.0, 100 + 10 * (day - 20000), 50.0]:
+                stats = myscript.forecast_update(stats, day, value, 30)
+        self.assertEqual(stats['count'], 9)
+        self.assertEqual(stats['peak'], 190)
+        # the peaks of day 20009 are closed when day 20010 starts
+        stats = myscript.forecast_update(stats, 20010, 0.0, 30)
+        self.assertAlmostEqual(myscript.forecast_days(stats, 20010, 300.0), 10.0, places=3)
+        self.assertEqual(myscript.forecast_days(stats, 20010, 300.0, min_days=11), None)
+        self.assertEqual(myscript.forecast_days(stats, 20010, 100.0), 0.0)
+
+    def test_flat(self):
+        stats = None
+        for day in range(10):
+            stats = myscript.forecast_update(stats, day, 100.0, 30)
+        self.assertEqual(myscript.forecast_days(stats, 10, 300.0), None)
+
+    def test_inverted_status(self):
+        service = myscript.NagiosService()
+        service.label, service.inverted = 'forecast-in-eth0', True
+        service.warn_level, service.crit_level, service.max_level = 30, 7, ''
+        service.value = 40
+        self.assertEqual(service.status(), 'OK')
+        service.value = 20
+        self.assertEqual(service.status(), 'WARNING')
+        service.value = 7
+        self.assertEqual(service.status(), 'CRITICAL')
+        self.assertEqual(str(service), 'forecast-in-eth0=7.00;30:;7:;0;')
+
+
+class Baseline(unittest.TestCase):
+
+    def test_welford(self):
+        values = [2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0]
+        stats = None
+        for value in values:
+            stats = myscript.welford_update(stats, value)
+        count, mean, m2 = stats
+        self.assertEqual(count, 8)
+        self.assertAlmostEqual(mean, 5.0)
+        self.assertAlmostEqual(m2 / (count - 1), 32.0 / 7, places=4)
+
+    def test_zscore(self):
+        stats = [5, 10.0, 40.0]  # standard deviation: 10 ** 0.5
+        self.assertAlmostEqual(myscript.calc_zscore(stats, 10.0 + 3 * 10 ** 0.5), 3.0)
+        self.assertEqual(myscript.calc_zscore(stats, 20.0, min_samples=6), None)
+        self.assertEqual(myscript.calc_zscore(None, 20.0), None)
+        self.assertEqual(myscript.calc_zscore(stats, 110.0, min_deviation=50.0), 2.0)
+
+    def test_bucket(self):
+        self.assertEqual(myscript.baseline_bucket(0, 'none'), '0')
+        localtime = time.localtime(1000000)
+        self.assertEqual(myscript.baseline_bucket(1000000, 'hour-of-day'),
+                         str(localtime.tm_hour))
+        self.assertEqual(myscript.baseline_bucket(1000000, 'hour-of-week'),
+                         str(localtime.tm_wday * 24 + localtime.tm_hour))
+
+    def test_status(self):
+        service = myscript.NagiosService()
+        service.value, service.warn_level, service.crit_level = 10, 80, 90
+        service.warn_zscore, service.crit_zscore = 3, 5
+        self.assertEqual(service.status(), 'OK')
+        service.zscore = -3.5
+        self.assertEqual(service.status(), 'WARNING')
+        service.zscore = 6
+        self.assertEqual(service.status(), 'CRITICAL')
+
+
+class Self_Benchmark(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(myscript.percentile(values, 50), 50)
+        self.assertEqual(myscript.percentile(values, 99), 99)
+        self.assertEqual(myscript.percentile([3.0], 99), 3.0)
+
+    def test_self_benchmark(self):
+        default_values = myscript.get_default_values()
+        data_file = './unit-tests-benchmark'
+        archive = './unit-tests-benchmark-archive'
+        args = myscript.parse_arguments(default_values, [
+            '--self-benchmark', '--benchmark-iterations', '3', '-f', data_file,
+            '--archive', archive])
+        results, output = myscript.self_benchmark(args, default_values)
+        self.assertFalse(os.path.exists(data_file))
+        self.assertFalse(os.path.exists(archive))
+        phases = [result[0] for result in results]
+        self.assertEqual(phases[:2], ['read', 'parse'])
+        self.assertEqual(phases[-1], 'check')
+        for phase, wall_times, cpu_times, peak_rss, rss_growth in results:
+            self.assertEqual(len(wall_times), 3)
+            self.assertEqual(len(cpu_times), 3)
+            self.assertGreater(peak_rss, 0)
+        self.assertTrue(output.startswith('Traffic Bps'))
+
+    def test_peak_rss_per_phase(self):
+        if not myscript.reset_peak_rss():
+            self.skipTest('/proc/self/clear_refs is not writable')
+        # a big allocation must not show up in the peak of the next phase
+        buff = bytearray(100 * 1000 * 1000)
+        del buff
+        self.assertGreater(myscript.memory_status()['VmHWM'], 100000)
+        myscript.reset_peak_rss()
+        self.assertLess(myscript.memory_status()['VmHWM'], 100000)
+
+    def test_recommendations(self):
+        default_values = myscript.get_default_values()
+        results = [('read', [0.001], [0.001], 1, 0), ('parse', [0.002], [0.002], 1, 0),
+                   ('linktype', [0.02], [0.001], 1, 0), ('check', [0.2], [0.1], 1, 0)]
+        args = myscript.parse_arguments(default_values, [])
+        self.assertEqual(len(myscript.benchmark_recommendations(results, 2000, args)), 4)
+        args = myscript.parse_arguments(default_values, ['-x', 'lo'])
+        self.assertEqual(myscript.benchmark_recommendations(results[:2], 100, args), [])
+
+
 if __name__ == "__main__":
     print ("Python version: ", sys.version.split('\n', 1)[0])
     unittest.main()